@@ -0,0 +1,394 @@
+# benchmark.py
+"""Offline benchmark for the whole graph.
+
+Runs `build_workflow()` against local stand-ins (recorded Tavily responses, a local HTTP server
+serving saved blog pages, a fake chat model with configurable latency, a fake YouTube client and
+an SMTP sink) and reports end-to-end and per-node latency percentiles at several concurrency levels.
+
+    python benchmark.py --runs 20 --concurrency 1,4,16
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json --tolerance 0.2
+    python benchmark.py --import-budget 1500
+"""
+import argparse
+import asyncio
+import copy
+import functools
+import json
+import os
+import re
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+# Provider SDKs that must only be imported when their client is first built (see config.py).
+LAZY_MODULES = ("langchain_groq", "tavily", "googleapiclient", "httplib2", "bs4")
+# A run without any of these outputs counts as a failure.
+REQUIRED_OUTPUTS = ("best_product", "youtube_link", "email_content")
+# Per-node p95 regressions below this many milliseconds are treated as noise.
+NODE_REGRESSION_FLOOR_MS = 5.0
+
+
+class _PageHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_page_server(latency: float = 0.0):
+    """Serve the saved blog pages over HTTP on a free local port."""
+    handler = type("PageHandler", (_PageHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=FIXTURES_DIR))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP (EHLO, AUTH, MAIL, RCPT, DATA, QUIT) for smtplib to deliver into a counter."""
+
+    def _reply(self, *lines):
+        self.wfile.write("".join(line + "\r\n" for line in lines).encode())
+
+    def handle(self):
+        self._reply("220 localhost benchmark SMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self._reply("250-localhost", "250-AUTH PLAIN LOGIN", "250 OK")
+            elif verb == "AUTH":
+                self._reply("235 Authentication successful")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with self.server.lock:
+                    self.server.messages += 1
+                self._reply("250 OK queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("250 OK")
+
+
+def start_smtp_sink():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPSinkHandler)
+    server.daemon_threads = True
+    server.messages = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeTavilyClient:
+    """Replays recorded Tavily responses, pointing result URLs at the local page server."""
+
+    def __init__(self, base_url: str, latency: float = 0.0):
+        with open(os.path.join(FIXTURES_DIR, "tavily_responses.json")) as f:
+            self.responses = json.loads(f.read().replace("{base_url}", base_url))
+        self.latency = latency
+
+    def search(self, query, max_results=5, **kwargs):
+        time.sleep(self.latency)
+        response = copy.deepcopy(self.responses.get(query, self.responses["default"]))
+        response["query"] = query
+        response["results"] = response["results"][:max_results]
+        return response
+
+
+class FakeYouTube:
+    """Mimics `youtube.search().list(...).execute()`."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def search(self):
+        return self
+
+    def list(self, q="", **kwargs):
+        self.query = q
+        return self
+
+    def execute(self, http=None, **kwargs):
+        time.sleep(self.latency)
+        return {"items": [{"id": {"kind": "youtube#video", "videoId": "dQw4w9WgXcQ"}}]}
+
+    def close(self):
+        pass
+
+
+def make_fake_chat_model(base_url: str, latency: float):
+    """Chat model answering each prompt type with canned JSON after `latency` seconds."""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    with open(os.path.join(FIXTURES_DIR, "llm_responses.json")) as f:
+        canned = json.loads(f.read().replace("{base_url}", base_url))
+    markers = [
+        ("extracting structured information", "extraction"),
+        ("List of Products for Comparison", "comparison"),
+        ("ranked the candidate phones", "justification"),
+        ("email content writer", "email"),
+        ("Extract every smartphone", "extraction"),
+        ("Compare these smartphones", "comparison"),
+        ("top-ranked phone suits", "justification"),
+        ("recommendation email copy", "email"),
+    ]
+    product_name = re.compile(r"(?:Top-ranked Product|Product Name): (.+)")
+
+    class FakeChatModel(BaseChatModel):
+        model_name: str = "fake-benchmark-model"
+        temperature: float = 0.0
+        latency: float = 0.0
+
+        @property
+        def _llm_type(self) -> str:
+            return "fake-benchmark"
+
+        def _respond(self, messages):
+            prompt = "\n".join(str(message.content) for message in messages)
+            kind = next((kind for marker, kind in markers if marker in prompt), "extraction")
+            text = json.dumps(canned[kind])
+            match = product_name.search(prompt)
+            if match:
+                text = text.replace("{product_name}", match.group(1).strip())
+            message = AIMessage(content=text, usage_metadata={
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": len(text) // 4,
+                "total_tokens": (len(prompt) + len(text)) // 4,
+            })
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(self.latency)
+            return self._respond(messages)
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(self.latency)
+            return self._respond(messages)
+
+    from telemetry import TokenUsageHandler
+    return FakeChatModel(latency=latency, callbacks=[TokenUsageHandler()])
+
+
+def configure_environment(args, smtp_port: int) -> None:
+    """Point the project at the local stand-ins; must run before project modules are imported."""
+    os.environ.update({
+        "GROQ_API_KEY": "benchmark", "TAVILY_API_KEY": "benchmark", "YOUTUBE_API_KEY": "benchmark",
+        "GMAIL_USER": "benchmark@example.com", "GMAIL_PASS": "benchmark",
+        "SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(smtp_port), "SMTP_STARTTLS": "false",
+        "CACHE_DIR": args.cache_dir or tempfile.mkdtemp(prefix="consultant-bench-"),
+        "GROQ_RPM": "1000000", "TAVILY_RPM": "1000000", "YOUTUBE_RPM": "1000000", "SMTP_RPM": "1000000",
+    })
+    if not args.warm:
+        # Every run pays for fetching, extraction and comparison instead of hitting the caches.
+        os.environ.update({
+            "PAGE_CACHE_TTL": "0", "SEARCH_CACHE_TTL": "0", "LLM_CACHE_TTL": "0",
+            "LLM_CACHE_MEMORY_SIZE": "0", "PRODUCT_FRESHNESS": "0",
+        })
+
+
+def percentiles(values):
+    import numpy as np
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def run_level(concurrency: int, runs: int, use_async: bool, queries):
+    """Run `runs` consultations at the given concurrency; returns latency and throughput figures."""
+    from main import run_workflow, arun_workflow
+    from telemetry import telemetry
+
+    telemetry.reset()
+    jobs = [(queries[i % len(queries)], f"user{i}@example.com") for i in range(runs)]
+    latencies, failures = [], 0
+    missing = dict.fromkeys(REQUIRED_OUTPUTS, 0)
+
+    def timed(query, email):
+        start = time.perf_counter()
+        result = run_workflow(query, email)
+        return time.perf_counter() - start, result
+
+    async def atimed(query, email, semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await arun_workflow(query, email)
+            return time.perf_counter() - start, result
+
+    async def run_async():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(atimed(query, email, semaphore) for query, email in jobs))
+
+    started = time.perf_counter()
+    if use_async:
+        outcomes = asyncio.run(run_async())
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(lambda job: timed(*job), jobs))
+    wall = time.perf_counter() - started
+
+    for latency, result in outcomes:
+        latencies.append(latency)
+        absent = [key for key in REQUIRED_OUTPUTS if not (result or {}).get(key)]
+        for key in absent:
+            missing[key] += 1
+        failures += bool(absent)
+    snapshot = telemetry.snapshot()
+    nodes = {
+        name[len("node."):-len(".ms")]: {key: summary[key] for key in ("count", "p50", "p95", "p99")}
+        for name, summary in snapshot["histograms"].items()
+        if name.startswith("node.") and name.endswith(".ms")
+    }
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "failures": failures,
+        "missing": missing,
+        "throughput": runs / wall if wall else 0.0,
+        "end_to_end_ms": percentiles(latencies),
+        "nodes_ms": nodes,
+        "counters": snapshot["counters"],
+    }
+
+
+def print_report(results) -> None:
+    for level in results:
+        e2e = level["end_to_end_ms"]
+        print(f"\nconcurrency={level['concurrency']} runs={level['runs']} failures={level['failures']} "
+              f"throughput={level['throughput']:.2f}/s  e2e p50={e2e['p50']:.0f}ms p95={e2e['p95']:.0f}ms p99={e2e['p99']:.0f}ms")
+        missing = {key: count for key, count in level.get("missing", {}).items() if count}
+        if missing:
+            print("  missing: " + ", ".join(f"{key}={count}" for key, count in missing.items()))
+        for node, stats in sorted(level["nodes_ms"].items()):
+            print(f"  {node:<20} n={stats['count']:<5} p50={stats['p50']:.0f}ms p95={stats['p95']:.0f}ms")
+
+
+def check_baseline(results, baseline_path: str, tolerance: float) -> bool:
+    """Compare end-to-end and per-node p95 against a saved run; False when any regressed beyond `tolerance`.
+
+    Per-node regressions smaller than NODE_REGRESSION_FLOOR_MS are ignored, so near-zero nodes do not flap.
+    """
+    with open(baseline_path) as f:
+        baseline = {level["concurrency"]: level for level in json.load(f)["results"]}
+    ok = True
+    for level in results:
+        previous = baseline.get(level["concurrency"])
+        if previous is None:
+            continue
+        before, after = previous["end_to_end_ms"]["p95"], level["end_to_end_ms"]["p95"]
+        if before and after > before * (1 + tolerance):
+            print(f"REGRESSION at concurrency={level['concurrency']}: p95 {before:.0f}ms -> {after:.0f}ms")
+            ok = False
+        for node, stats in sorted(level["nodes_ms"].items()):
+            if node not in previous.get("nodes_ms", {}):
+                continue
+            before, after = previous["nodes_ms"][node]["p95"], stats["p95"]
+            if after > before * (1 + tolerance) and after - before > NODE_REGRESSION_FLOOR_MS:
+                print(f"REGRESSION at concurrency={level['concurrency']} in {node}: p95 {before:.0f}ms -> {after:.0f}ms")
+                ok = False
+    return ok
+
+
+def measure_import(module: str = "main", repeats: int = 3):
+    """Best-of-`repeats` cold import time of `module` in fresh interpreters, and the lazy modules it loaded."""
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"print(json.dumps({{'ms': elapsed, 'loaded': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = [
+        json.loads(subprocess.run([sys.executable, "-c", script], cwd=here, capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeats)
+    ]
+    return min(sample["ms"] for sample in samples), samples[-1]["loaded"]
+
+
+def check_import_budget(budget_ms: float) -> bool:
+    """False when importing the graph exceeds `budget_ms` or eagerly loads a provider SDK."""
+    elapsed, loaded = measure_import()
+    print(f"import main: {elapsed:.0f}ms (budget {budget_ms:.0f}ms)")
+    ok = elapsed <= budget_ms
+    if not ok:
+        print(f"REGRESSION: import main took {elapsed:.0f}ms")
+    if loaded:
+        print(f"REGRESSION: imported eagerly: {', '.join(loaded)}")
+        ok = False
+    return ok
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the Smartphone Consultant graph.")
+    parser.add_argument("--runs", type=int, default=20, help="consultations per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use arun_workflow instead of run_workflow")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="seconds per fake Tavily search")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="seconds per page served")
+    parser.add_argument("--youtube-latency", type=float, default=0.05, help="seconds per fake YouTube search")
+    parser.add_argument("--warm", action="store_true", help="keep caches and the product store enabled")
+    parser.add_argument("--cache-dir", help="cache directory (a fresh temporary one by default)")
+    parser.add_argument("--query", action="append", help="query to run (repeatable)")
+    parser.add_argument("--save", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="fail when e2e or per-node p95 regresses against this saved JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression ratio")
+    parser.add_argument("--trace", help="export a Chrome trace of the last level to this path")
+    parser.add_argument("--import-budget", type=float, help="only check that `import main` stays under this many ms")
+    args = parser.parse_args(argv)
+
+    if args.import_budget is not None:
+        return 0 if check_import_budget(args.import_budget) else 1
+
+    page_server, base_url = start_page_server(args.page_latency)
+    smtp_sink = start_smtp_sink()
+    configure_environment(args, smtp_sink.server_address[1])
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from config import registry
+    from telemetry import telemetry
+    registry.register("llm", lambda: make_fake_chat_model(base_url, args.llm_latency))
+    registry.register("tavily_client", lambda: FakeTavilyClient(base_url, args.search_latency))
+    registry.register("youtube", lambda: FakeYouTube(args.youtube_latency))
+
+    queries = args.query or ["best smartphones under $1000", "best camera phone", "best phone for gaming"]
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    results = [run_level(level, args.runs, args.use_async, queries) for level in levels]
+    print_report(results)
+    delivered = registry.get("mailer").flush(timeout=60)
+    print(f"\nemails delivered to SMTP sink: {smtp_sink.messages}" + ("" if delivered else " (outbox not drained)"))
+
+    if args.trace:
+        telemetry.export_trace(args.trace)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    page_server.shutdown()
+    smtp_sink.shutdown()
+    if args.baseline and not check_baseline(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
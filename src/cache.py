@@ -0,0 +1,194 @@
+# cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "smartphone_consultant"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", str(24 * 3600)))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600)))
+BLOB_TTL = int(os.getenv("BLOB_TTL", str(24 * 3600)))
+# Blobs used within this many seconds belong to runs still in flight and are never evicted for space.
+BLOB_GRACE = int(os.getenv("BLOB_GRACE", str(600)))
+
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|mc_cid|mc_eid|ref)$", re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so equivalent links share a cache entry."""
+    parts = urlsplit(url.strip())
+    netloc = parts.netloc.lower()
+    if parts.scheme == "http" and netloc.endswith(":80"):
+        netloc = netloc[:-3]
+    elif parts.scheme == "https" and netloc.endswith(":443"):
+        netloc = netloc[:-4]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(k)))
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path or "/", query, ""))
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query (case and whitespace)."""
+    return " ".join(query.lower().split())
+
+
+def content_key(*parts) -> str:
+    """Stable SHA-256 key for the given parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CacheEntry:
+    """A cached body together with its HTTP validators."""
+
+    __slots__ = ("value", "etag", "last_modified", "expires_at")
+
+    def __init__(self, value: bytes, etag: Optional[str], last_modified: Optional[str], expires_at: float):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+
+class DiskCache:
+    """Compressed, size-capped LRU cache in SQLite, shareable between processes on one host."""
+
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES, blob_grace: float = BLOB_GRACE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.blob_grace = blob_grace
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # WAL lets readers in other processes proceed while one process writes.
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[CacheEntry]:
+        """Return the entry (fresh or stale) for `key`, or None."""
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT body, etag, last_modified, expires_at FROM entries WHERE key = ?",
+                (f"{namespace}:{key}",)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), f"{namespace}:{key}"))
+            return CacheEntry(zlib.decompress(row[0]), row[1], row[2], row[3])
+        except (sqlite3.Error, zlib.error) as e:
+            print(f"Cache read failed for {namespace}:{key}: {e}")
+            return None
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: float,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """Store `value` compressed and evict least recently used entries over the size cap."""
+        body = zlib.compress(value)
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (f"{namespace}:{key}", namespace, body, len(body), etag, last_modified, now + ttl, now)
+            )
+            self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"Cache write failed for {namespace}:{key}: {e}")
+
+    def touch(self, namespace: str, key: str, ttl: float) -> None:
+        """Extend the expiry of an entry that was revalidated upstream."""
+        try:
+            now = time.time()
+            self._connect().execute(
+                "UPDATE entries SET expires_at = ?, accessed_at = ? WHERE key = ?",
+                (now + ttl, now, f"{namespace}:{key}")
+            )
+        except sqlite3.Error as e:
+            print(f"Cache touch failed for {namespace}:{key}: {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Trim to the size cap: expired blobs go first, then least recently used entries.
+
+        Blobs used within the last `blob_grace` seconds are skipped, since runs in flight read them back
+        by handle; older ones are evicted like any other entry (a resumed run fetches its pages again).
+        """
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE namespace = 'blob' AND expires_at <= ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            candidates = conn.execute(
+                "SELECT key, size FROM entries WHERE namespace != 'blob' OR accessed_at <= ? ORDER BY accessed_at",
+                (now - self.blob_grace,)
+            ).fetchall()
+            for key, size in candidates:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache() -> DiskCache:
+    """Return the process-wide cache stored under CACHE_DIR."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = DiskCache(os.path.join(CACHE_DIR, "cache.sqlite3"))
+    return _default_cache
+
+
+def put_blob(text: str, ttl: float = BLOB_TTL) -> str:
+    """Store text in the content store and return its handle; identical text shares one entry.
+
+    The blob is kept for `ttl` seconds at most; once unused for BLOB_GRACE seconds it may be evicted
+    earlier to keep the cache under CACHE_MAX_BYTES.
+    """
+    handle = content_key(text)
+    get_cache().set("blob", handle, text.encode("utf-8"), ttl)
+    return handle
+
+
+def get_blob(handle: str) -> Optional[str]:
+    """Text stored under `handle`, or None when it has expired."""
+    entry = get_cache().get("blob", handle)
+    return entry.value.decode("utf-8") if entry is not None and entry.fresh else None
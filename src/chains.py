@@ -0,0 +1,144 @@
+# chains.py
+import json
+import threading
+from typing import Any, Dict, List, Optional, Union, get_args, get_origin
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+from config import PROMPT_STYLE, LLM_OUTPUT_MODE
+from extraction import estimate_tokens
+from scheduler import IncompleteResult
+from models import ListOfSmartphoneReviews, ProductComparison, BestProduct, EmailRecommendation
+from prompts import (
+    schema_mapping_prompt, product_comparison_prompt, justification_prompt, email_template_prompt,
+    schema_mapping_prompt_compact, product_comparison_prompt_compact, justification_prompt_compact,
+    email_template_prompt_compact
+)
+
+
+def _skeleton(annotation) -> Any:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {name: _skeleton(field.annotation) for name, field in annotation.model_fields.items()}
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin in (list, List):
+        return [_skeleton(args[0])] if args else []
+    if origin is Union:
+        return _skeleton(next(arg for arg in args if arg is not type(None)))
+    if annotation in (int, float):
+        return "number"
+    if annotation in (dict, Dict) or origin in (dict, Dict):
+        return {}
+    return "str"
+
+
+def compact_format_instructions(model) -> str:
+    """One-line JSON skeleton of a Pydantic model, far shorter than `JsonOutputParser` format instructions."""
+    return "Return only JSON shaped like: " + json.dumps(_skeleton(model), separators=(",", ":"))
+
+
+class PromptSpec:
+    """A prompt template with its output schema and parser, built once at import."""
+
+    __slots__ = ("name", "model", "template", "parser", "json_prompt", "native_prompt")
+
+    def __init__(self, name: str, model, template: str, input_variables: List[str], compact: bool = False):
+        self.name = name
+        self.model = model
+        self.template = template
+        self.parser = JsonOutputParser(pydantic_object=model)
+        instructions = compact_format_instructions(model) if compact else self.parser.get_format_instructions()
+        self.json_prompt = PromptTemplate(
+            template=template, input_variables=input_variables,
+            partial_variables={"format_instructions": instructions}
+        )
+        # With native structured output the schema travels as a tool definition, not prompt text.
+        self.native_prompt = PromptTemplate(
+            template=template, input_variables=input_variables, partial_variables={"format_instructions": ""}
+        )
+
+
+PROMPTS = {
+    style: {
+        "schema_mapping": PromptSpec("schema_mapping", ListOfSmartphoneReviews, templates[0], ["blogs_content"], compact),
+        "product_comparison": PromptSpec("product_comparison", ProductComparison, templates[1], ["product_data"], compact),
+        "justification": PromptSpec(
+            "justification", BestProduct, templates[2], ["user_query", "product_name", "ranking", "product_notes"], compact
+        ),
+        "email": PromptSpec("email", EmailRecommendation, templates[3], ["product_name", "justification_line", "user_query"], compact),
+    }
+    for style, templates, compact in [
+        ("full", (schema_mapping_prompt, product_comparison_prompt, justification_prompt, email_template_prompt), False),
+        ("compact", (schema_mapping_prompt_compact, product_comparison_prompt_compact, justification_prompt_compact,
+                     email_template_prompt_compact), True),
+    ]
+}
+
+
+def prompt_spec(name: str, style: Optional[str] = None) -> PromptSpec:
+    return PROMPTS[style or PROMPT_STYLE][name]
+
+
+def prompt_template(name: str, style: Optional[str] = None) -> str:
+    """Template text in use for `name`; LLM cache keys hash it so switching styles never reuses stale answers."""
+    return prompt_spec(name, style).template
+
+
+def _as_dict(response):
+    if response is None:
+        # The model answered without calling the schema tool; the scheduler retries parse failures.
+        raise IncompleteResult("Model returned no structured output.")
+    return response.model_dump() if isinstance(response, BaseModel) else response
+
+
+def _build_chain(spec: PromptSpec, llm, mode: str):
+    if mode != "json":
+        try:
+            return spec.native_prompt | llm.with_structured_output(spec.model) | RunnableLambda(_as_dict)
+        except NotImplementedError:
+            if mode == "native":
+                raise
+    return spec.json_prompt | llm | spec.parser
+
+
+_chains: Dict[tuple, tuple] = {}
+_chains_lock = threading.Lock()
+
+
+def get_chain(name: str, llm, style: Optional[str] = None, mode: str = LLM_OUTPUT_MODE):
+    """Chain for prompt `name` bound to `llm`, built on first use and reused by every later call."""
+    key = (name, style or PROMPT_STYLE, mode, id(llm))
+    entry = _chains.get(key)
+    if entry is None or entry[0] is not llm:
+        with _chains_lock:
+            entry = _chains.get(key)
+            if entry is None or entry[0] is not llm:
+                entry = (llm, _build_chain(prompt_spec(name, style), llm, mode))
+                _chains[key] = entry
+    return entry[1]
+
+
+def warm_up_chains(llm) -> None:
+    for name in PROMPTS[PROMPT_STYLE]:
+        get_chain(name, llm)
+
+
+def prompt_token_cost(name: str, style: Optional[str] = None, mode: str = "json", **inputs) -> int:
+    """Estimated prompt tokens for `name`; with no inputs this is the fixed instruction overhead per call."""
+    spec = prompt_spec(name, style)
+    prompt = spec.json_prompt if mode == "json" else spec.native_prompt
+    values = {variable: inputs.get(variable, "") for variable in prompt.input_variables}
+    return estimate_tokens(prompt.format(**values))
+
+
+def prompt_costs() -> Dict[str, Dict[str, int]]:
+    """Fixed prompt overhead in tokens for every prompt, style and output mode."""
+    return {
+        name: {f"{style}/{mode}": prompt_token_cost(name, style, mode) for style in PROMPTS for mode in ("json", "native")}
+        for name in PROMPTS["full"]
+    }
+
+
+if __name__ == "__main__":
+    for name, costs in prompt_costs().items():
+        print(f"{name:<20} " + "  ".join(f"{variant}={tokens}" for variant, tokens in costs.items()))
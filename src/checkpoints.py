@@ -0,0 +1,114 @@
+# checkpoints.py
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+import aiosqlite
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from cache import CACHE_DIR
+
+CHECKPOINTING = os.getenv("CHECKPOINTING", "true").lower() == "true"
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(CACHE_DIR, "checkpoints.sqlite3"))
+# Opt-in: fail a run at a non-essential step (YouTube lookup, email queueing) so it can be resumed there,
+# instead of logging the error and finishing without that step's output.
+CHECKPOINT_FAIL_HARD = os.getenv("CHECKPOINT_FAIL_HARD", "false").lower() == "true"
+# Runs idle for longer than this lose their checkpoints (and with them resume/replay).
+CHECKPOINT_RETENTION = int(os.getenv("CHECKPOINT_RETENTION", str(7 * 24 * 3600)))
+CHECKPOINT_PRUNE_INTERVAL = int(os.getenv("CHECKPOINT_PRUNE_INTERVAL", str(3600)))
+
+# LangGraph's tables carry no timestamps, so run activity is tracked alongside them.
+_RUNS_SCHEMA = "CREATE TABLE IF NOT EXISTS runs (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+
+# State records stored in checkpoints; anything else custom is refused on load.
+_serde = JsonPlusSerializer(allowed_msgpack_modules=[("models", "ProductRecord"), ("models", "ComparisonRecord")])
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+_runs_local = threading.local()
+_last_prune = None
+_prune_lock = threading.Lock()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def get_checkpointer() -> SqliteSaver:
+    """Process-wide SQLite checkpointer for the sync graph (it serializes access internally)."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = SqliteSaver(_connect(CHECKPOINT_DB_PATH), serde=_serde)
+    return _checkpointer
+
+
+@asynccontextmanager
+async def async_checkpointer():
+    """Async SQLite checkpointer; aiosqlite connections belong to one event loop, so one is opened per run."""
+    os.makedirs(os.path.dirname(CHECKPOINT_DB_PATH) or ".", exist_ok=True)
+    async with aiosqlite.connect(CHECKPOINT_DB_PATH, timeout=30) as conn:
+        await conn.execute("PRAGMA journal_mode=WAL")
+        yield AsyncSqliteSaver(conn, serde=_serde)
+
+
+def _runs_conn() -> sqlite3.Connection:
+    conn = getattr(_runs_local, "conn", None)
+    if conn is None:
+        conn = _connect(CHECKPOINT_DB_PATH)
+        conn.isolation_level = None
+        conn.execute(_RUNS_SCHEMA)
+        _runs_local.conn = conn
+    return conn
+
+
+def prune_checkpoints(retention: float = CHECKPOINT_RETENTION) -> int:
+    """Delete the checkpoints of every run idle for longer than `retention` seconds; returns how many."""
+    conn = _runs_conn()
+    now = time.time()
+    try:
+        # Threads checkpointed before activity was tracked start their retention period now.
+        conn.execute(
+            "INSERT OR IGNORE INTO runs (thread_id, updated_at) SELECT DISTINCT thread_id, ? FROM checkpoints", (now,)
+        )
+    except sqlite3.OperationalError:
+        pass  # No checkpoint has been written to this database yet.
+    stale = [row[0] for row in conn.execute("SELECT thread_id FROM runs WHERE updated_at < ?", (now - retention,))]
+    saver = get_checkpointer()
+    for thread_id in stale:
+        saver.delete_thread(thread_id)
+        conn.execute("DELETE FROM runs WHERE thread_id = ?", (thread_id,))
+    return len(stale)
+
+
+def track_run(run_id: str) -> None:
+    """Record activity on a run, pruning expired runs at most once per CHECKPOINT_PRUNE_INTERVAL."""
+    global _last_prune
+    if not CHECKPOINTING:
+        return
+    try:
+        _runs_conn().execute("INSERT OR REPLACE INTO runs (thread_id, updated_at) VALUES (?, ?)", (run_id, time.time()))
+        due = _last_prune is None or time.monotonic() - _last_prune >= CHECKPOINT_PRUNE_INTERVAL
+        if not due or not _prune_lock.acquire(blocking=False):
+            return
+        try:
+            _last_prune = time.monotonic()
+            pruned = prune_checkpoints()
+        finally:
+            _prune_lock.release()
+        if pruned:
+            print(f"Pruned checkpoints of {pruned} expired run(s).")
+    except sqlite3.Error as e:
+        print(f"Checkpoint retention failed: {e}")
+
+
+def run_config(run_id: str) -> Dict:
+    """Graph config addressing the checkpoints of one run."""
+    return {"configurable": {"thread_id": run_id}}
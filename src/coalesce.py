@@ -0,0 +1,108 @@
+# coalesce.py
+import asyncio
+import os
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Union
+from cache import content_key, normalize_query
+from telemetry import telemetry
+
+COALESCE_NORMALIZER = os.getenv("COALESCE_NORMALIZER", "basic")
+
+_STOPWORDS = {"a", "an", "the", "for", "of", "in", "on", "with", "to", "and", "or", "me", "my", "i", "is", "are", "what", "which", "please"}
+
+
+def keyword_query(query: str) -> str:
+    """Order-insensitive key: lower-case words and numbers without punctuation or filler words."""
+    words = re.findall(r"[a-z0-9$]+", query.lower())
+    return " ".join(sorted({word for word in words if word not in _STOPWORDS}))
+
+
+QUERY_NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "exact": str.strip,
+    "basic": normalize_query,
+    "keywords": keyword_query,
+}
+
+_normalizer = QUERY_NORMALIZERS[COALESCE_NORMALIZER]
+
+
+def set_query_normalizer(normalizer: Union[str, Callable[[str], str]]) -> None:
+    """Choose how queries are normalized before coalescing: a QUERY_NORMALIZERS name or any callable."""
+    global _normalizer
+    _normalizer = QUERY_NORMALIZERS[normalizer] if isinstance(normalizer, str) else normalizer
+
+
+def query_key(stage: str, query: str, *inputs) -> tuple:
+    """Single-flight key for a pipeline stage working on `query`.
+
+    Stages that read more than the query (page text, candidate products) pass those `inputs` too, so runs
+    only share a computation when they would have computed the same thing.
+    """
+    return (stage, _normalizer(query or ""), content_key(*inputs) if inputs else "")
+
+
+def _stage(key: Hashable) -> str:
+    return str(key[0] if isinstance(key, tuple) else key)
+
+
+class AsyncSingleFlight:
+    """Let concurrent coroutines with the same key share one in-flight computation."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `fn()` once per key; callers arriving while it runs get the same result."""
+        # Futures belong to a single event loop, so never share them across loops.
+        key = (id(asyncio.get_running_loop()), key)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            telemetry.count(f"coalesce.{_stage(key[1])}.joined")
+        # Shield so one caller being cancelled does not cancel the shared work.
+        return await asyncio.shield(future)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-based counterpart of `AsyncSingleFlight` for the sync graph."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run `fn()` once per key; threads arriving while it runs block and get the same result (or error)."""
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+        if not leader:
+            telemetry.count(f"coalesce.{_stage(key)}.joined")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
@@ -1,33 +1,229 @@
 # config.py
-from langchain_groq import ChatGroq
-from tavily import TavilyClient
-from googleapiclient.discovery import build
-import os 
+import os
 import json
+import threading
+import atexit
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from telemetry import TokenUsageHandler
+from mailer import Mailer
 load_dotenv()
 
-os.environ["GROQ_API_KEY"] = os.getenv("GROQ_API_KEY")
-os.environ["TAVILY_API_KEY"] = os.getenv("TAVILY_API_KEY")
-os.environ["YOUTUBE_API_KEY"] = os.getenv("YOUTUBE_API_KEY")
-def load_config():
-    """Load API keys and initialize clients."""
+# API keys are read when each client is first built, so importing this module never requires them.
+# Provider SDKs (Groq, Tavily, Google API client, HTTP libraries) are likewise imported inside their
+# factories: a process only pays for the clients it actually uses, and only when it first uses them.
+
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+# Blog search fan-out; the fetch pool and per-host limits are shared by every run in the process.
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "5"))
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "32"))
+FETCH_PER_HOST_LIMIT = int(os.getenv("FETCH_PER_HOST_LIMIT", "2"))
+FETCH_PAGE_TIMEOUT = float(os.getenv("FETCH_PAGE_TIMEOUT", "10"))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "20"))
+
+# Chunked schema extraction
+EXTRACTION_CHUNK_TOKENS = int(os.getenv("EXTRACTION_CHUNK_TOKENS", "3000"))
+EXTRACTION_MAX_TOKENS = int(os.getenv("EXTRACTION_MAX_TOKENS", "24000"))
+EXTRACTION_CONCURRENCY = int(os.getenv("EXTRACTION_CONCURRENCY", "4"))
+
+# "local": rank with ranking.py and use the LLM only for the justification; "llm": full LLM comparison.
+RANKING_MODE = os.getenv("RANKING_MODE", "local")
+
+# "full" or "compact" prompt templates (see prompts.py).
+PROMPT_STYLE = os.getenv("PROMPT_STYLE", "full")
+# "auto": native structured output when the model supports tool calling, else JSON parsing; "native"; "json".
+LLM_OUTPUT_MODE = os.getenv("LLM_OUTPUT_MODE", "auto")
+
+
+class ClientRegistry:
+    """Process-wide registry that builds clients lazily and shares them across nodes."""
+
+    def __init__(self):
+        self._factories = {}
+        self._closers = {}
+        self._clients = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, closer=None):
+        """Register (or replace) the factory used to build a client."""
+        with self._lock:
+            self._factories[name] = factory
+            self._closers[name] = closer
+            old = self._clients.pop(name, None)
+        if old is not None:
+            self._close_client(name, old, closer)
+
+    def get(self, name):
+        """Return the client for `name`, building it on first use."""
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                if name not in self._factories:
+                    raise KeyError(f"No client registered under '{name}'.")
+                client = self._factories[name]()
+                self._clients[name] = client
+            return client
+
+    def warm_up(self, names=None):
+        """Build the given clients (all registered ones by default) ahead of the first request."""
+        for name in names or list(self._factories):
+            self.get(name)
+
+    def close(self):
+        """Close every built client; they are rebuilt lazily if requested again."""
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for name, client in clients.items():
+            self._close_client(name, client, self._closers.get(name))
+
+    @staticmethod
+    def _close_client(name, client, closer):
+        try:
+            if closer is not None:
+                closer(client)
+            elif hasattr(client, "close"):
+                client.close()
+        except Exception as e:
+            print(f"Error closing client '{name}': {e}")
+
+
+def _build_http_session():
+    """Pooled HTTP session shared by page fetches."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HostSlots:
+    """Connection slots for one host. Callers that find none free register a callback instead of blocking."""
+
+    def __init__(self, limit: int):
+        self._free = limit
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Take a slot if one is free right now."""
+        with self._lock:
+            if self._free:
+                self._free -= 1
+                return True
+            return False
+
+    def release(self) -> None:
+        """Free a slot and wake the first waiter still interested in it."""
+        with self._lock:
+            self._free += 1
+        self._wake()
 
-    # Initialize LLM
-    llm = ChatGroq(
-        model="llama-3.3-70b-versatile",
+    def when_free(self, callback) -> None:
+        """Call `callback()` once a slot is free (now, if one already is); it returns False if no longer interested."""
+        with self._lock:
+            self._waiters.append(callback)
+        self._wake()
+
+    def _wake(self) -> None:
+        while True:
+            with self._lock:
+                if not self._free or not self._waiters:
+                    return
+                callback = self._waiters.popleft()
+            if callback():
+                return
+
+
+class HostLimiter:
+    """Per-host concurrency limits shared by every page fetch in the process, whichever run issues it."""
+
+    def __init__(self, per_host: int = FETCH_PER_HOST_LIMIT):
+        self.per_host = per_host
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def for_host(self, host: str) -> HostSlots:
+        slots = self._hosts.get(host)
+        if slots is None:
+            with self._lock:
+                slots = self._hosts.setdefault(host, HostSlots(self.per_host))
+        return slots
+
+
+def _build_fetch_executor():
+    return ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="fetch")
+
+
+def _build_llm_http():
+    import httpx
+    return httpx.Client(limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE))
+
+
+def _build_llm():
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model=LLM_MODEL,
         api_key=os.environ["GROQ_API_KEY"],
-        temperature=0.5,
+        temperature=LLM_TEMPERATURE,
+        http_client=registry.get("llm_http"),
+        callbacks=[TokenUsageHandler()],
     )
 
-    # Initialize Tavily for web search
-    tavily_client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
 
-    # Initialize YouTube API
-    youtube = build('youtube', 'v3', developerKey=os.environ["YOUTUBE_API_KEY"])
+def _build_tavily_client():
+    from tavily import TavilyClient
+    return TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
 
+
+def youtube_http():
+    """Per-thread HTTP transport for YouTube requests (httplib2 is not thread-safe)."""
+    http = getattr(_thread_local, "youtube_http", None)
+    if http is None:
+        import httplib2
+        http = httplib2.Http(timeout=FETCH_PAGE_TIMEOUT)
+        _thread_local.youtube_http = http
+    return http
+
+
+def _build_youtube():
+    from googleapiclient.discovery import build
+    # The static discovery document ships with the library, so no network round trip is needed.
+    return build('youtube', 'v3', developerKey=os.environ["YOUTUBE_API_KEY"], static_discovery=True, cache_discovery=False)
+
+
+_thread_local = threading.local()
+registry = ClientRegistry()
+registry.register("http_session", _build_http_session)
+# Page fetches from concurrent runs share one pool and one set of per-host limits.
+registry.register("fetch_executor", _build_fetch_executor, closer=lambda executor: executor.shutdown(wait=False, cancel_futures=True))
+registry.register("host_limiter", HostLimiter, closer=lambda limiter: None)
+registry.register("llm_http", _build_llm_http)
+registry.register("llm", _build_llm, closer=lambda client: None)
+registry.register("tavily_client", _build_tavily_client, closer=lambda client: None)
+registry.register("youtube", _build_youtube)
+# Outbound mail workers; closing drains what is due and leaves the rest queued on disk.
+registry.register("mailer", lambda: Mailer().start())
+atexit.register(registry.close)
+
+
+def get_client(name):
+    """Return a shared client from the process-wide registry."""
+    return registry.get(name)
+
+
+def load_config():
+    """Load API keys and initialize clients."""
     return {
-        "llm": llm,
-        "tavily_client": tavily_client,
-        "youtube": youtube
-    }
\ No newline at end of file
+        "llm": get_client("llm"),
+        "tavily_client": get_client("tavily_client"),
+        "youtube": get_client("youtube")
+    }
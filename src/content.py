@@ -0,0 +1,114 @@
+# content.py
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List
+from urllib.parse import urlparse
+from extraction import estimate_tokens
+
+_NOISE_TAGS = ["script", "style", "noscript", "nav", "footer", "header", "aside", "form", "iframe", "svg", "button"]
+# Matched against each dash/underscore separated token of an element's id and classes.
+_NOISE_TOKEN = re.compile(
+    r"^(ads?|advert\w*|banner|breadcrumbs?|comments?|consent|cookies?|footer|gdpr|menu|modal|nav\w*|newsletter|"
+    r"popup|promo\w*|related|share\w*|sidebar|social|subscribe\w*)$",
+    re.IGNORECASE
+)
+_BLOCK_TAGS = ["h1", "h2", "h3", "h4", "p", "li", "td", "blockquote"]
+_HEADING_TAGS = {"h1", "h2", "h3", "h4"}
+PHONE_MODEL = re.compile(
+    r"\b(iphone|galaxy|pixel|oneplus|xiaomi|redmi|poco|motorola|moto\s?[a-z]\d*|nothing\s+phone|xperia|oppo|vivo|"
+    r"realme|honor|huawei|zenfone|rog\s+phone|nokia|iqoo|tecno|infinix|samsung|apple|google)\b",
+    re.IGNORECASE
+)
+
+
+def _is_noise(tag) -> bool:
+    attrs = " ".join([tag.get("id") or ""] + (tag.get("class") or []))
+    return any(_NOISE_TOKEN.match(token) for token in re.split(r"[\s_-]+", attrs) if token)
+
+
+def _main_root(soup):
+    """The element most likely to hold the article body."""
+    articles = soup.find_all("article")
+    if articles:
+        return max(articles, key=lambda a: len(a.get_text(" ", strip=True)))
+    if soup.main:
+        return soup.main
+    # Otherwise pick the container holding the most paragraph text.
+    weights = Counter()
+    for paragraph in soup.find_all("p"):
+        if paragraph.parent is not None:
+            weights[id(paragraph.parent)] += len(paragraph.get_text(" ", strip=True))
+    if weights:
+        best = weights.most_common(1)[0][0]
+        for paragraph in soup.find_all("p"):
+            if id(paragraph.parent) == best:
+                return paragraph.parent
+    return soup.body or soup
+
+
+def article_blocks(html) -> List[Dict]:
+    """Main-article text blocks (`{"tag", "text"}`) with navigation, banners and comments removed."""
+    from bs4 import BeautifulSoup, Comment
+    soup = BeautifulSoup(html, "html.parser")
+    for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
+        comment.extract()
+    for tag in soup.find_all(_NOISE_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(_is_noise):
+        if tag.name not in ("html", "body") and not tag.decomposed:
+            tag.decompose()
+    blocks = []
+    for tag in _main_root(soup).find_all(_BLOCK_TAGS):
+        # Nested blocks (a <p> inside an <li>) are emitted by their innermost tag only.
+        if tag.find(_BLOCK_TAGS):
+            continue
+        text = tag.get_text(" ", strip=True)
+        if text:
+            blocks.append({"tag": tag.name, "text": text})
+    return blocks
+
+
+def prune_to_phone_mentions(blocks: List[Dict]) -> List[Dict]:
+    """Keep blocks that name a phone, plus the body of sections whose heading names one."""
+    kept = []
+    in_phone_section = False
+    for block in blocks:
+        mentions = bool(PHONE_MODEL.search(block["text"]))
+        if block["tag"] in _HEADING_TAGS:
+            in_phone_section = mentions
+        if mentions or in_phone_section:
+            kept.append(block)
+    return kept
+
+
+def slim_pages(pages: Dict[str, bytes]) -> Dict[str, Dict]:
+    """Reduce raw pages to phone-relevant article text, reporting tokens before and after."""
+    from bs4 import BeautifulSoup
+    blocks_by_url = {}
+    tokens_before = {}
+    for url, html in pages.items():
+        tokens_before[url] = estimate_tokens(BeautifulSoup(html, "html.parser").get_text(" ", strip=True))
+        blocks_by_url[url] = article_blocks(html)
+
+    # Blocks repeated on several pages from the same host are site boilerplate.
+    urls_by_host = defaultdict(list)
+    for url in pages:
+        urls_by_host[urlparse(url).netloc].append(url)
+    for urls in urls_by_host.values():
+        if len(urls) < 2:
+            continue
+        counts = Counter(text for url in urls for text in {block["text"] for block in blocks_by_url[url]})
+        for url in urls:
+            blocks_by_url[url] = [block for block in blocks_by_url[url] if counts[block["text"]] < 2]
+
+    slimmed = {}
+    for url, blocks in blocks_by_url.items():
+        relevant = prune_to_phone_mentions(blocks) or blocks
+        content = "\n".join(block["text"] for block in relevant)
+        slimmed[url] = {
+            "content": content,
+            "tokens_before": tokens_before[url],
+            "tokens_after": estimate_tokens(content),
+        }
+        print(f"Slimmed {url}: {tokens_before[url]} -> {slimmed[url]['tokens_after']} tokens.")
+    return slimmed
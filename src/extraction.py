@@ -0,0 +1,163 @@
+# extraction.py
+import re
+from typing import Dict, Iterable, List
+from llm_cache import normalize_title
+from models import as_dict, text_items, highlights_dict
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def clean_text(text: str) -> str:
+    """Collapse whitespace within each block and drop sentences repeated within the page.
+
+    Newlines between blocks (as produced by `slim_pages`) are kept so spec tables and lists, which rarely
+    end in punctuation, can still be split there.
+    """
+    seen = set()
+    blocks = []
+    for line in text.splitlines():
+        sentences = []
+        for sentence in _SENTENCE_END.split(" ".join(line.split())):
+            key = sentence.lower()
+            if key and key not in seen:
+                seen.add(key)
+                sentences.append(sentence)
+        if sentences:
+            blocks.append(" ".join(sentences))
+    return "\n".join(blocks)
+
+
+def _hard_split(piece: str, max_chars: int) -> List[str]:
+    """Cut a piece longer than `max_chars` at word boundaries (mid-word only for a single oversized word)."""
+    parts, current = [], ""
+    for word in piece.split(" "):
+        while len(word) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(word[:max_chars])
+            word = word[max_chars:]
+        if current and len(current) + 1 + len(word) > max_chars:
+            parts.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def text_pieces(text: str, chunk_tokens: int) -> List[str]:
+    """Sentences of cleaned text, split at block boundaries too, none longer than `chunk_tokens`."""
+    max_chars = chunk_tokens * 4
+    pieces = []
+    for line in text.splitlines():
+        for sentence in _SENTENCE_END.split(line):
+            if sentence:
+                pieces.extend(_hard_split(sentence, max_chars) if estimate_tokens(sentence) > chunk_tokens else [sentence])
+    return pieces
+
+
+def chunk_blogs(blogs_content: List[Dict], chunk_tokens: int, max_total_tokens: int) -> List[Dict]:
+    """Split cleaned blog text into chunks of at most `chunk_tokens`, stopping at the run budget.
+
+    Blogs are consumed in search-relevance order, so the budget drops the least relevant text.
+    Sentences already seen on another page are skipped.
+    """
+    seen = set()
+    chunks = []
+    total = 0
+    max_chars = chunk_tokens * 4
+    for blog in blogs_content:
+        current, current_chars = [], 0
+        budget_reached = False
+        for piece in text_pieces(clean_text(blog.get("content", "")), chunk_tokens):
+            key = piece.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            tokens = estimate_tokens(piece)
+            if total + tokens > max_total_tokens:
+                budget_reached = True
+                break
+            # Chunk size is measured on the joined text, separators included.
+            if current and current_chars + 1 + len(piece) > max_chars:
+                chunks.append(_chunk(blog, current))
+                current, current_chars = [], 0
+            current.append(piece)
+            current_chars += len(piece) + (1 if current_chars else 0)
+            total += tokens
+        if current:
+            chunks.append(_chunk(blog, current))
+        if budget_reached or total >= max_total_tokens:
+            print(f"Extraction token budget of {max_total_tokens} reached; remaining content skipped.")
+            break
+    return chunks
+
+
+def _chunk(blog: Dict, sentences: List[str]) -> Dict:
+    return {"title": blog.get("title", ""), "url": blog.get("url", ""), "content": " ".join(sentences)}
+
+
+def products_from_response(response: Dict) -> List[Dict]:
+    """Products from a parsed extraction response (the prompt asks for `products`, the schema says `reviews`)."""
+    if isinstance(response, list):
+        return response
+    return response.get("products") or response.get("reviews") or []
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ProductMerger:
+    """Incrementally merge extracted products, deduplicating by normalized title."""
+
+    def __init__(self):
+        self._products: Dict[str, Dict] = {}
+
+    def add(self, products: Iterable[Dict]) -> List[Dict]:
+        """Merge `products` in and return the ones not seen before."""
+        added = []
+        for product in products:
+            key = normalize_title(product.get("title") or "")
+            if not key:
+                continue
+            product = self._normalized(product)
+            existing = self._products.get(key)
+            if existing is None:
+                self._products[key] = product
+                added.append(product)
+            else:
+                self._merge(existing, product)
+        return added
+
+    @staticmethod
+    def _normalized(product) -> Dict:
+        """Copy of `product` with list and dict fields in their schema shapes, whatever the LLM returned."""
+        product = as_dict(product)
+        for field in ("pros", "cons"):
+            product[field] = list(text_items(product.get(field)))
+        product["highlights"] = highlights_dict(product.get("highlights"))
+        return product
+
+    @staticmethod
+    def _merge(existing: Dict, product: Dict) -> None:
+        for field in ("pros", "cons"):
+            existing[field] = existing[field] + [item for item in product[field] if item not in existing[field]]
+        existing["highlights"] = {**product["highlights"], **existing["highlights"]}
+        if len(product.get("content") or "") > len(existing.get("content") or ""):
+            existing["content"] = product["content"]
+        existing["score"] = max(_as_float(existing.get("score")), _as_float(product.get("score")))
+        existing["url"] = existing.get("url") or product.get("url")
+
+    def products(self) -> List[Dict]:
+        return list(self._products.values())
@@ -0,0 +1,104 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+from cache import DiskCache, get_cache, content_key
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "256"))
+LLM_CACHE_NEAR_DUPLICATES = os.getenv("LLM_CACHE_NEAR_DUPLICATES", "false").lower() == "true"
+
+
+def template_hash(template: str) -> str:
+    """Hash of a prompt template, so editing the prompt invalidates old responses."""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+def normalize_title(title: str) -> str:
+    """Lower-case a product title and drop punctuation and extra whitespace."""
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in title.lower()).split())
+
+
+def title_set_key(titles: Iterable[str]) -> str:
+    """Order-independent key built from a set of product titles."""
+    return content_key(sorted({normalize_title(t) for t in titles if t}))
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU + disk) cache of parsed LLM chain responses."""
+
+    def __init__(self, disk: Optional[DiskCache] = None, memory_size: int = LLM_CACHE_MEMORY_SIZE,
+                 ttl: float = LLM_CACHE_TTL, near_duplicates: bool = LLM_CACHE_NEAR_DUPLICATES):
+        self._disk = disk
+        self._memory = OrderedDict()
+        self._memory_size = memory_size
+        self._ttl = ttl
+        self.near_duplicates = near_duplicates
+        self._lock = threading.Lock()
+        self.metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    @property
+    def disk(self) -> DiskCache:
+        if self._disk is None:
+            self._disk = get_cache()
+        return self._disk
+
+    @staticmethod
+    def make_key(llm, template: str, inputs: Dict[str, Any]) -> str:
+        """Key on model name, temperature, template hash and a canonical hash of the inputs."""
+        model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+        temperature = getattr(llm, "temperature", None)
+        canonical_inputs = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+        return content_key(model, temperature, template_hash(template), canonical_inputs)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return self._memory[key]
+        entry = self.disk.get("llm", key)
+        if entry is not None and entry.fresh:
+            value = json.loads(entry.value)
+            self._remember(key, value)
+            with self._lock:
+                self.metrics["disk_hits"] += 1
+            return value
+        with self._lock:
+            self.metrics["misses"] += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        self.disk.set("llm", key, json.dumps(value).encode("utf-8"), self._ttl)
+        with self._lock:
+            self.metrics["writes"] += 1
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_size:
+                self._memory.popitem(last=False)
+
+    def lookup(self, llm, template: str, inputs: Dict[str, Any], titles: Optional[Iterable[str]] = None):
+        """Return `(key, cached_value)`; with near-duplicate mode the key uses the product title set."""
+        if self.near_duplicates and titles is not None:
+            key = self.make_key(llm, template, {"titles": title_set_key(titles)})
+        else:
+            key = self.make_key(llm, template, inputs)
+        return key, self.get(key)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and the overall hit rate."""
+        with self._lock:
+            stats = dict(self.metrics)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+llm_cache = LLMResponseCache()
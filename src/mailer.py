@@ -0,0 +1,395 @@
+# mailer.py
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict, Iterable, List, Optional, Tuple
+from cache import CACHE_DIR
+from scheduler import RetryPolicy, scheduler
+from telemetry import span, telemetry
+from dotenv import load_dotenv
+load_dotenv()
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+
+MAIL_DB_PATH = os.getenv("MAIL_DB_PATH", os.path.join(CACHE_DIR, "outbox.sqlite3"))
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+# Providers drop long-lived sessions; reconnect after this many messages or seconds idle.
+MAIL_MESSAGES_PER_CONNECTION = int(os.getenv("MAIL_MESSAGES_PER_CONNECTION", "100"))
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", "60"))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "5"))
+MAIL_LEASE_SECONDS = float(os.getenv("MAIL_LEASE_SECONDS", "300"))
+MAIL_DRAIN_TIMEOUT = float(os.getenv("MAIL_DRAIN_TIMEOUT", "30"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    idempotency_key TEXT,
+    lease_token TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+_INDEXES = "CREATE UNIQUE INDEX IF NOT EXISTS outbox_idempotency ON outbox (idempotency_key);"
+
+
+class Outbox:
+    """Persistent SQLite mail queue; `status` moves queued -> sending -> sent, or to dead after the last attempt."""
+
+    def __init__(self, path: str = MAIL_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(outbox)")}
+        for column in ("idempotency_key", "lease_token"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE outbox ADD COLUMN {column} TEXT")
+        conn.executescript(_INDEXES)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue_many(self, messages: Iterable[Tuple]) -> List[Tuple[int, bool]]:
+        """Queue (recipient, subject, html_body[, idempotency_key]) messages in one transaction.
+
+        Returns `(id, queued)` per message. A message whose idempotency key is already in the outbox is not
+        queued again; its existing id is returned with `queued=False`.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = []
+            for recipient, subject, body, *rest in messages:
+                key = rest[0] if rest else None
+                cursor = conn.execute(
+                    """INSERT INTO outbox (recipient, subject, body, idempotency_key, next_attempt_at, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(idempotency_key) DO NOTHING""",
+                    (recipient, subject, body, key, now, now, now)
+                )
+                if cursor.rowcount:
+                    ids.append((cursor.lastrowid, True))
+                else:
+                    ids.append((conn.execute("SELECT id FROM outbox WHERE idempotency_key = ?", (key,)).fetchone()[0], False))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def claim(self, limit: int = MAIL_BATCH_SIZE, lease: float = MAIL_LEASE_SECONDS) -> List[Dict]:
+        """Lease up to `limit` due messages; a crashed worker's lease expires and the message is claimed again.
+
+        Each row carries the `lease_token` of this claim. Updates made with a token that has since been
+        superseded by another worker's claim are ignored, so a message is never settled twice.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """SELECT * FROM outbox WHERE status IN ('queued', 'sending') AND next_attempt_at <= ?
+                   ORDER BY next_attempt_at LIMIT ?""",
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                """UPDATE outbox SET status = 'sending', attempts = attempts + 1, lease_token = ?, next_attempt_at = ?,
+                   updated_at = ? WHERE id = ?""",
+                [(token, now + lease, now, row["id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [dict(row, attempts=row["attempts"] + 1, lease_token=token) for row in rows]
+
+    def renew(self, message_id: int, token: str, lease: float = MAIL_LEASE_SECONDS) -> bool:
+        """Extend the lease on one message just before sending it; False when another worker has taken it over."""
+        now = time.time()
+        return self._connect().execute(
+            "UPDATE outbox SET next_attempt_at = ?, updated_at = ? WHERE id = ? AND status = 'sending' AND lease_token = ?",
+            (now + lease, now, message_id, token)
+        ).rowcount == 1
+
+    def mark_sent(self, message_id: int, token: str) -> bool:
+        return self._connect().execute(
+            "UPDATE outbox SET status = 'sent', last_error = NULL, lease_token = NULL, updated_at = ? WHERE id = ? AND lease_token = ?",
+            (time.time(), message_id, token)
+        ).rowcount == 1
+
+    def mark_failed(self, message_id: int, token: str, error: str, retry_in: Optional[float]) -> bool:
+        """Schedule another attempt in `retry_in` seconds, or dead-letter the message when it is None."""
+        now = time.time()
+        if retry_in is None:
+            cursor = self._connect().execute(
+                "UPDATE outbox SET status = 'dead', last_error = ?, lease_token = NULL, updated_at = ? WHERE id = ? AND lease_token = ?",
+                (error, now, message_id, token)
+            )
+        else:
+            cursor = self._connect().execute(
+                """UPDATE outbox SET status = 'queued', last_error = ?, lease_token = NULL, next_attempt_at = ?, updated_at = ?
+                   WHERE id = ? AND lease_token = ?""",
+                (error, now + retry_in, now, message_id, token)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, rows: List[Dict]) -> None:
+        """Return leased but unattempted messages to the queue (used when a worker stops mid-batch)."""
+        now = time.time()
+        self._connect().executemany(
+            """UPDATE outbox SET status = 'queued', attempts = attempts - 1, lease_token = NULL, next_attempt_at = ?, updated_at = ?
+               WHERE id = ? AND lease_token = ?""",
+            [(now, now, row["id"], row["lease_token"]) for row in rows]
+        )
+
+    def requeue_dead(self) -> int:
+        """Give every dead-lettered message a fresh set of attempts."""
+        now = time.time()
+        return self._connect().execute(
+            "UPDATE outbox SET status = 'queued', attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = 'dead'",
+            (now, now)
+        ).rowcount
+
+    def dead_letters(self, limit: int = 100) -> List[Dict]:
+        rows = self._connect().execute(
+            "SELECT id, recipient, subject, attempts, last_error, updated_at FROM outbox WHERE status = 'dead' ORDER BY updated_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def busy(self) -> bool:
+        """True while a message is being sent or is due for delivery."""
+        return self._connect().execute(
+            "SELECT 1 FROM outbox WHERE status = 'sending' OR (status = 'queued' AND next_attempt_at <= ?) LIMIT 1",
+            (time.time(),)
+        ).fetchone() is not None
+
+    def next_due(self) -> Optional[float]:
+        return self._connect().execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status IN ('queued', 'sending')"
+        ).fetchone()[0]
+
+
+class PermanentMailError(Exception):
+    """The server rejected the message itself; retrying will not help."""
+
+
+def build_message(sender: str, recipient: str, subject: str, body: str) -> MIMEMultipart:
+    message = MIMEMultipart()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    message.attach(MIMEText(body, 'html'))
+    return message
+
+
+class SMTPConnection:
+    """One authenticated SMTP session reused across messages, reconnecting when stale or dropped."""
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, starttls: bool = SMTP_STARTTLS):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.sender = None
+        self._server = None
+        self._sent = 0
+        self._last_used = 0.0
+
+    def _open(self) -> None:
+        self.sender = os.environ["GMAIL_USER"]
+        with span("smtp_connect", host=self.host):
+            server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+            try:
+                if self.starttls:
+                    server.starttls()
+                server.login(self.sender, os.environ["GMAIL_PASS"])
+            except Exception:
+                server.close()
+                raise
+        self._server = server
+        self._sent = 0
+
+    def _stale(self) -> bool:
+        return (self._sent >= MAIL_MESSAGES_PER_CONNECTION
+                or time.monotonic() - self._last_used > MAIL_IDLE_TIMEOUT)
+
+    def send(self, recipient: str, subject: str, body: str) -> None:
+        if self._server is not None and self._stale():
+            self.close()
+        if self._server is None:
+            self._open()
+        try:
+            refused = self._server.send_message(build_message(self.sender, recipient, subject, body))
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentMailError(str(e.recipients)) from e
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500:
+                raise PermanentMailError(f"{e.smtp_code} {e.smtp_error!r}") from e
+            raise
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Dropped session: discard it so the retry reconnects.
+            self._server = None
+            raise
+        finally:
+            self._last_used = time.monotonic()
+        if refused:
+            raise PermanentMailError(str(refused))
+        self._sent += 1
+
+    def close(self) -> None:
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+
+class Mailer:
+    """Background delivery of the outbox: a few workers, each with its own pooled SMTP connection."""
+
+    def __init__(self, outbox: Optional[Outbox] = None, workers: int = MAIL_WORKERS,
+                 retry_policy: Optional[RetryPolicy] = None):
+        self.outbox = outbox or Outbox()
+        self.workers = workers
+        # Backoff between persisted attempts; each attempt itself is a single try.
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=MAIL_MAX_ATTEMPTS, base_delay=30.0, max_delay=3600.0)
+        self._single_attempt = RetryPolicy(max_attempts=1)
+        self._threads: List[threading.Thread] = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> "Mailer":
+        with self._lock:
+            if not self._threads:
+                self._stopping.clear()
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"mailer-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        return self
+
+    def enqueue(self, recipient: str, subject: str, body: str, idempotency_key: Optional[str] = None) -> Tuple[int, bool]:
+        """Queue one email without waiting for delivery; returns its outbox id and whether it was newly queued."""
+        return self.enqueue_many([(recipient, subject, body, idempotency_key)])[0]
+
+    def enqueue_many(self, messages: Iterable[Tuple]) -> List[Tuple[int, bool]]:
+        results = self.outbox.enqueue_many(messages)
+        queued = sum(1 for _, new in results if new)
+        telemetry.count("mail.enqueued", queued)
+        if queued < len(results):
+            telemetry.count("mail.deduplicated", len(results) - queued)
+        self._wakeup.set()
+        return results
+
+    def notify(self) -> None:
+        """Wake idle workers, e.g. after another process queued mail in the shared outbox."""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        connection = SMTPConnection()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    batch = self.outbox.claim()
+                except sqlite3.Error as e:
+                    print(f"Mail worker could not read the outbox: {e}")
+                    self._stopping.wait(MAIL_POLL_INTERVAL)
+                    continue
+                if not batch:
+                    next_due = self.outbox.next_due()
+                    timeout = MAIL_POLL_INTERVAL if next_due is None else min(MAIL_POLL_INTERVAL, max(0.0, next_due - time.time()))
+                    self._wakeup.wait(timeout)
+                    self._wakeup.clear()
+                    continue
+                for i, row in enumerate(batch):
+                    if self._stopping.is_set():
+                        self.outbox.release(batch[i:])
+                        break
+                    self._deliver(connection, row)
+        finally:
+            connection.close()
+
+    def _deliver(self, connection: SMTPConnection, row: Dict) -> None:
+        # Rate limiting can hold a batch past its lease; renewing per message keeps another worker from
+        # reclaiming (and sending) what this one is about to send.
+        if not self.outbox.renew(row["id"], row["lease_token"]):
+            telemetry.count("mail.lease_lost")
+            return
+        try:
+            scheduler.call("smtp", connection.send, row["recipient"], row["subject"], row["body"],
+                           policy=self._single_attempt)
+        except Exception as e:
+            permanent = isinstance(e, PermanentMailError) or row["attempts"] >= self.retry_policy.max_attempts
+            retry_in = None if permanent else self.retry_policy.backoff(row["attempts"])
+            self.outbox.mark_failed(row["id"], row["lease_token"], repr(e), retry_in)
+            if permanent:
+                telemetry.count("mail.dead")
+                print(f"Email to {row['recipient']} dead-lettered after {row['attempts']} attempt(s): {e}")
+            else:
+                telemetry.count("mail.retried")
+                print(f"Email to {row['recipient']} failed ({e}); retrying in {retry_in:.0f}s.")
+            return
+        self.outbox.mark_sent(row["id"], row["lease_token"])
+        telemetry.count("mail.sent")
+        print(f"Email sent successfully to {row['recipient']}.")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no message is in flight or due now; False if `timeout` expired first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.outbox.busy():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._wakeup.set()
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = MAIL_DRAIN_TIMEOUT) -> None:
+        """Drain what is due (up to `timeout`) and stop the workers; undelivered mail stays queued on disk."""
+        if self._threads:
+            self.flush(timeout)
+        self._stopping.set()
+        self._wakeup.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout=SMTP_TIMEOUT)
+
+
+if __name__ == "__main__":
+    # Deliver whatever is queued (e.g. after a digest run) and report the outbox state.
+    mailer = Mailer().start()
+    mailer.flush()
+    mailer.close()
+    print(mailer.outbox.stats())
@@ -1,48 +1,273 @@
 # main.py
 from langgraph.graph import StateGraph, START, END
-from nodes import tavily_search_node, schema_mapping_node, product_comparison_node, youtube_review_node, display_node, send_email_node
-from models import State
+from nodes import (
+    tavily_search_node, schema_mapping_node, product_comparison_node, youtube_review_node, display_node, send_email_node,
+    atavily_search_node, aschema_mapping_node, aproduct_comparison_node, ayoutube_review_node, asend_email_node,
+    email_copy_node, aemail_copy_node, product_store_node, route_after_store
+)
+from models import State, WorkflowEvent
+from config import registry
+from chains import warm_up_chains
+from telemetry import traced_node, run_context
+from checkpoints import CHECKPOINTING, get_checkpointer, async_checkpointer, run_config, track_run
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+import asyncio
+import os
+import threading
+import uuid
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+SYNC_NODES = {
+    "product_store": product_store_node,
+    "tavily_search": tavily_search_node,
+    "schema_mapping": schema_mapping_node,
+    "product_comparison": product_comparison_node,
+    "youtube_review": youtube_review_node,
+    "email_copy": email_copy_node,
+    "display": display_node,
+    "send_email": send_email_node,
+}
+
+ASYNC_NODES = {
+    "product_store": product_store_node,
+    "tavily_search": atavily_search_node,
+    "schema_mapping": aschema_mapping_node,
+    "product_comparison": aproduct_comparison_node,
+    "youtube_review": ayoutube_review_node,
+    "email_copy": aemail_copy_node,
+    "display": display_node,
+    "send_email": asend_email_node,
+}
+
+_compiled_workflows = {}
+_compile_lock = threading.Lock()
 
 def build_workflow():
-    """Build and return the LangGraph workflow."""
+    """Build and return the LangGraph workflow, compiling it only once per process."""
+    return _get_compiled("sync", SYNC_NODES, get_checkpointer if CHECKPOINTING else None)
+
+def build_async_workflow():
+    """Build and return the workflow wired with the async node variants (checkpointer attached per run)."""
+    return _get_compiled("async", ASYNC_NODES)
+
+def _get_compiled(name, nodes, checkpointer=None):
+    workflow = _compiled_workflows.get(name)
+    if workflow is None:
+        with _compile_lock:
+            workflow = _compiled_workflows.get(name)
+            if workflow is None:
+                workflow = _compile_workflow(nodes, checkpointer() if checkpointer else None)
+                _compiled_workflows[name] = workflow
+    return workflow
+
+@asynccontextmanager
+async def _async_workflow():
+    workflow = build_async_workflow()
+    if not CHECKPOINTING:
+        yield workflow
+        return
+    async with async_checkpointer() as saver:
+        yield workflow.copy(update={"checkpointer": saver})
+
+def _compile_workflow(nodes, checkpointer=None):
     workflow = StateGraph(State)
     
     # Add nodes
-    workflow.add_node("tavily_search", tavily_search_node)
-    workflow.add_node("schema_mapping", schema_mapping_node)
-    workflow.add_node("product_comparison", product_comparison_node)
-    workflow.add_node("youtube_review", youtube_review_node)
-    workflow.add_node("display", display_node)
-    workflow.add_node("send_email", send_email_node)
+    for name, node in nodes.items():
+        workflow.add_node(name, traced_node(name, node))
     
     # Define edges
-    workflow.add_edge(START, "tavily_search")
+    workflow.add_edge(START, "product_store")
+    workflow.add_conditional_edges("product_store", route_after_store, {"store": "product_comparison", "web": "tavily_search"})
     workflow.add_edge("tavily_search", "schema_mapping")
     workflow.add_edge("schema_mapping", "product_comparison")
+    # The YouTube search and the email copy both depend only on best_product, so they run in parallel.
     workflow.add_edge("product_comparison", "youtube_review")
-    workflow.add_edge("youtube_review", "display")
+    workflow.add_edge("product_comparison", "email_copy")
+    workflow.add_edge(["youtube_review", "email_copy"], "display")
     workflow.add_edge("display", "send_email")
     workflow.add_edge("send_email", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
 
-def run_workflow(query: str, email: str):
-    """Run the ShopGenie workflow with the given query and email."""
-    workflow = build_workflow()
-    initial_state = State(
+def initial_state(query: str, email: str, run_id: str = "") -> State:
+    """Empty workflow state for a single consultation."""
+    return State(
+        run_id=run_id,
+        email_key="",
         query=query,
         email=email,
-        products=[],
         product_schema=[],
         blogs_content=[],
         best_product={},
         comparison=[],
-        youtube_link=""
+        ranking=[],
+        youtube_link="",
+        email_content={}
     )
-    
-    result = workflow.invoke(initial_state)
+
+def _run_input(checkpointed: bool, query: str, email: str, run_id: str) -> Optional[State]:
+    """Initial state for a new run, or None so LangGraph resumes a checkpointed run where it stopped."""
+    return None if checkpointed else initial_state(query, email, run_id)
+
+def run_workflow(query: str, email: str, run_id: Optional[str] = None):
+    """Run the ShopGenie workflow with the given query and email.
+
+    Pass the `run_id` of a failed run to resume it: nodes that already completed are not run again.
+    """
+    workflow = build_workflow()
+    run_id = run_id or uuid.uuid4().hex
+    track_run(run_id)
+    config = run_config(run_id)
+    checkpointed = CHECKPOINTING and bool(workflow.get_state(config).values)
+    with run_context(run_id):
+        result = workflow.invoke(_run_input(checkpointed, query, email, run_id), config)
     return result
 
+async def arun_workflow(query: str, email: str, run_id: Optional[str] = None):
+    """Async counterpart of `run_workflow`."""
+    run_id = run_id or uuid.uuid4().hex
+    await asyncio.to_thread(track_run, run_id)
+    config = run_config(run_id)
+    async with _async_workflow() as workflow:
+        checkpointed = CHECKPOINTING and bool((await workflow.aget_state(config)).values)
+        with run_context(run_id):
+            return await workflow.ainvoke(_run_input(checkpointed, query, email, run_id), config)
+
+def resume_workflow(run_id: str):
+    """Continue a checkpointed run from its last completed node."""
+    track_run(run_id)
+    with run_context(run_id):
+        return build_workflow().invoke(None, run_config(run_id))
+
+def replay_node(run_id: str, node: str, updates: Optional[Dict] = None, resend_email: bool = False):
+    """Re-run a checkpointed run from `node` onward, optionally with modified inputs.
+
+    The run forks from the checkpoint taken just before `node` first ran; later checkpoints are kept
+    in the history, so the original result stays inspectable.
+
+    The recommendation email is sent at most once per run, so a replay that reaches `send_email` does not
+    email the user again, even if the recommendation changed. Pass `resend_email=True` to queue the
+    replayed recommendation as a new email.
+    """
+    workflow = build_workflow()
+    track_run(run_id)
+    # Forks written by earlier replays (source "update") are skipped, so every replay starts from the run itself.
+    before = next(
+        (snapshot for snapshot in workflow.get_state_history(run_config(run_id))
+         if node in snapshot.next and snapshot.metadata.get("source") == "loop"),
+        None
+    )
+    if before is None:
+        raise ValueError(f"Run {run_id} has no checkpoint before node '{node}'.")
+    config = before.config
+    if resend_email:
+        updates = {**(updates or {}), "email_key": f"recommendation:{run_id}:{uuid.uuid4().hex}"}
+    if updates:
+        config = workflow.update_state(config, updates, as_node=_predecessor(workflow, before, node))
+    with run_context(run_id):
+        return workflow.invoke(None, config)
+
+def _predecessor(workflow, snapshot, node: str) -> str:
+    """Node whose completion scheduled `node` in `snapshot`; updates written as it keep `node` next."""
+    parent = snapshot.parent_config and workflow.get_state(snapshot.parent_config)
+    ran = [task.name for task in (parent.tasks if parent else ()) if task.name != node]
+    return ran[0] if ran else "__start__"
+
+async def run_batch(queries: Iterable[Tuple[str, str]], max_concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[Dict]:
+    """Run many `(query, email)` consultations concurrently, yielding each result as it completes."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(index, query, email):
+        async with semaphore:
+            try:
+                return {"index": index, "query": query, "email": email, "result": await arun_workflow(query, email)}
+            except Exception as e:
+                print(f"Consultation {index} failed: {e}")
+                return {"index": index, "query": query, "email": email, "error": str(e)}
+
+    tasks = [asyncio.create_task(run_one(index, query, email)) for index, (query, email) in enumerate(queries)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+STREAM_MODES = ["updates", "custom", "messages"]
+
+def _tool_call_text(message) -> str:
+    """Streamed arguments of a structured-output tool call; with native output the JSON arrives here, not in content."""
+    return "".join(chunk.get("args") or "" for chunk in getattr(message, "tool_call_chunks", None) or ())
+
+def _events(mode, chunk) -> List[WorkflowEvent]:
+    """Translate one LangGraph stream chunk into typed workflow events."""
+    if mode == "custom":
+        return [WorkflowEvent(type=chunk["type"], node="schema_mapping", data=chunk["product"])]
+    if mode == "messages":
+        message, metadata = chunk
+        if metadata.get("langgraph_node") == "product_comparison":
+            text = message.content or _tool_call_text(message)
+            if text:
+                return [WorkflowEvent(type="token", node="product_comparison", data=text)]
+        return []
+    events = []
+    for node, update in chunk.items():
+        update = update or {}
+        if node == "product_store" and update.get("product_schema"):
+            events.append(WorkflowEvent(type="products", node=node, data=update["product_schema"]))
+        elif node == "tavily_search":
+            sources = [{"title": blog["title"], "url": blog["url"]} for blog in update.get("blogs_content") or []]
+            events.append(WorkflowEvent(type="sources_found", node=node, data=sources))
+        elif node == "schema_mapping":
+            events.append(WorkflowEvent(type="products", node=node, data=update.get("product_schema") or []))
+        elif node == "product_comparison":
+            if update.get("ranking"):
+                events.append(WorkflowEvent(type="ranking", node=node, data=update["ranking"]))
+            if update.get("comparison"):
+                events.append(WorkflowEvent(type="comparison", node=node, data=update["comparison"]))
+            events.append(WorkflowEvent(type="best_product", node=node, data=update.get("best_product") or {}))
+        elif node == "youtube_review":
+            events.append(WorkflowEvent(type="youtube_link", node=node, data=update.get("youtube_link")))
+        elif node == "send_email":
+            events.append(WorkflowEvent(type="email_sent", node=node, data=None))
+    return events
+
+def stream_workflow(query: str, email: str, run_id: Optional[str] = None) -> Iterator[WorkflowEvent]:
+    """Run the workflow, yielding typed events as each node (and each extracted product) completes."""
+    workflow = build_workflow()
+    run_id = run_id or uuid.uuid4().hex
+    track_run(run_id)
+    config = run_config(run_id)
+    checkpointed = CHECKPOINTING and bool(workflow.get_state(config).values)
+    with run_context(run_id):
+        for mode, chunk in workflow.stream(_run_input(checkpointed, query, email, run_id), config, stream_mode=STREAM_MODES):
+            yield from _events(mode, chunk)
+
+async def astream_workflow(query: str, email: str, run_id: Optional[str] = None) -> AsyncIterator[WorkflowEvent]:
+    """Async counterpart of `stream_workflow`."""
+    run_id = run_id or uuid.uuid4().hex
+    await asyncio.to_thread(track_run, run_id)
+    config = run_config(run_id)
+    async with _async_workflow() as workflow:
+        checkpointed = CHECKPOINTING and bool((await workflow.aget_state(config)).values)
+        with run_context(run_id):
+            async for mode, chunk in workflow.astream(_run_input(checkpointed, query, email, run_id), config, stream_mode=STREAM_MODES):
+                for event in _events(mode, chunk):
+                    yield event
+
+def warm_up():
+    """Build shared clients and the compiled graph before serving requests."""
+    registry.warm_up()
+    warm_up_chains(registry.get("llm"))
+    build_workflow()
+
+def shutdown():
+    """Release shared clients (HTTP pools, API sessions)."""
+    registry.close()
+
 if __name__ == "__main__":
     # Example usage
     query = "best smartphones under $1000"
@@ -1,6 +1,7 @@
 # models.py
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from dataclasses import dataclass, field, fields
+from typing import Any, List, Optional, Dict, Tuple
 from typing_extensions import TypedDict
 
 class SpecsComparison(BaseModel):
@@ -54,12 +55,99 @@ class EmailRecommendation(BaseModel):
     heading: str = Field(..., description="The main heading of the email, introducing the recommended product.")
     justification_line: str = Field(..., description="A concise explanation of why the product is being recommended.")
 
+class WorkflowEvent(BaseModel):
+    type: str = Field(..., description="Event type, e.g. 'sources_found', 'product_extracted', 'ranking', 'best_product', 'youtube_link', 'token'")
+    node: str = Field(..., description="Graph node that produced the event")
+    data: Any = Field(None, description="Event payload")
+
+class Record:
+    """Read access shared by the slotted state records, so code written against dicts keeps working."""
+
+    __slots__ = ()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        return cls(**{f.name: data.get(f.name) for f in fields(cls) if data.get(f.name) is not None})
+
+# Parsed LLM output is not validated against the schema, so a single string may stand in for a list
+# (pros, cons) or a dict (highlights).
+def text_items(value) -> Tuple[str, ...]:
+    """`pros`/`cons` value as a tuple of strings; a lone string is one item."""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
+
+def highlights_dict(value) -> Dict[str, Any]:
+    """`highlights` value as a dict; a lone string is kept under "Summary", anything else is dropped."""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value:
+        return {"Summary": value}
+    return {}
+
+@dataclass(slots=True)
+class ProductRecord(Record):
+    """Compact in-state form of a `SmartphoneReview`."""
+    title: str = ""
+    url: Optional[str] = None
+    content: Optional[str] = None
+    pros: Tuple[str, ...] = ()
+    cons: Tuple[str, ...] = ()
+    highlights: Dict[str, Any] = field(default_factory=dict)
+    score: Optional[float] = None
+
+    def __post_init__(self):
+        self.pros = text_items(self.pros)
+        self.cons = text_items(self.cons)
+        self.highlights = highlights_dict(self.highlights)
+        try:
+            self.score = None if self.score is None else float(self.score)
+        except (TypeError, ValueError):
+            self.score = None
+
+@dataclass(slots=True)
+class ComparisonRecord(Record):
+    """Compact in-state form of a `Comparison`."""
+    product_name: str = ""
+    specs_comparison: Dict[str, str] = field(default_factory=dict)
+    ratings_comparison: Dict[str, float] = field(default_factory=dict)
+    reviews_summary: str = ""
+
+def as_dict(record) -> Dict[str, Any]:
+    """Plain dict for a record (or a copy of a dict), e.g. for JSON or the product store."""
+    return record.to_dict() if isinstance(record, Record) else dict(record)
+
 class State(TypedDict):
+    # Nodes that run in parallel (youtube_review, email_copy) must write disjoint keys;
+    # every node returns only the keys it changes.
+    # Page text never enters the state: `blogs_content` entries carry a `content_ref` handle into the
+    # content store (cache.put_blob), and schema_mapping drops the handles once extraction is done.
+    run_id: str
+    # Idempotency key of the recommendation email when it is not the run's own (see main.replay_node).
+    email_key: str
     query: str
     email: str
-    products: List[Dict]
-    product_schema: List[SmartphoneReview]
+    product_schema: List[ProductRecord]
     blogs_content: Optional[List[Dict]]
     best_product: Dict
-    comparison: List
-    youtube_link: str
\ No newline at end of file
+    comparison: List[ComparisonRecord]
+    ranking: List[Dict]
+    youtube_link: str
+    email_content: Dict
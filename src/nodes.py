@@ -1,39 +1,92 @@
 # nodes.py
 from typing import Dict
-from models import State, ListOfSmartphoneReviews, ProductComparison, EmailRecommendation
-from utils import load_blog_content
-from config import load_config
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import PromptTemplate
+from models import State, ProductRecord, ComparisonRecord, as_dict
+from utils import load_blog_pages, search_web, send_email
+from content import slim_pages
+from store import get_store, covers_query
+from llm_cache import llm_cache
+from scheduler import scheduler
+from extraction import chunk_blogs, products_from_response, ProductMerger
+from config import get_client, youtube_http, SEARCH_MAX_RESULTS, FETCH_PAGE_TIMEOUT, FETCH_DEADLINE
+from config import EXTRACTION_CHUNK_TOKENS, EXTRACTION_MAX_TOKENS, EXTRACTION_CONCURRENCY, RANKING_MODE
+from prompts import email_html_template
+from chains import get_chain, prompt_template
+from ranking import rank_products, feature_ratings, candidate_name
+from specs import parse_processor, review_text
+from coalesce import AsyncSingleFlight, SingleFlight, query_key
+from cache import put_blob, get_blob
+from checkpoints import CHECKPOINTING, CHECKPOINT_FAIL_HARD
+from llm_cache import normalize_title
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from langgraph.config import get_stream_writer
+import asyncio
+import contextvars
 import json
-import time
 
+# Share identical in-flight stages (search, extraction, comparison, YouTube lookups) between concurrent runs;
+# only the per-user steps (email copy and sending) run once per consultation.
+_flights = AsyncSingleFlight()
+_sync_flights = SingleFlight()
 
-def tavily_search_node(state: State) -> Dict:
-    """Search with Tavily and store content."""
-    config = load_config()
-    tavily_client = config["tavily_client"]
+
+def product_store_node(state: State) -> Dict:
+    """Pre-fill the product schema from the local product store."""
+    try:
+        products = get_store().find_for_query(state.get('query', ''))
+    except Exception as e:
+        print(f"Error reading product store: {e}")
+        return {}
+    if products:
+        covered = covers_query(state.get('query', ''), products)
+        print(f"Product store returned {len(products)} fresh products" + ("." if covered else "; searching the web for the rest."))
+    return {"product_schema": [ProductRecord.from_dict(product) for product in products]}
+
+def route_after_store(state: State) -> str:
+    """Skip the web only when the stored products answer the whole query; partial matches are merged after the search."""
+    return "store" if covers_query(state.get('query', ''), state.get("product_schema") or []) else "web"
+
+def _step_failed(message: str, error: Exception) -> None:
+    """Log and carry on, or with CHECKPOINT_FAIL_HARD fail the checkpointed run so it can be resumed at this node."""
+    if CHECKPOINTING and CHECKPOINT_FAIL_HARD:
+        raise error
+    print(f"{message}: {error}")
+
+def _remember_products(upsert, *args) -> None:
+    try:
+        upsert(*args)
+    except Exception as e:
+        print(f"Error updating product store: {e}")
+
+def _tavily_search(state: State) -> Dict:
+    tavily_client = get_client("tavily_client")
     try:
         query = state.get('query', '')
-        response = tavily_client.search(query=query, max_results=1)
+        response = search_web(tavily_client, query, SEARCH_MAX_RESULTS)
         if "results" not in response or not response["results"]:
             raise ValueError("No results found for the given query.")
         
+        blogs = [blog for blog in response['results'] if blog.get("url")]
+        pages = load_blog_pages(
+            [blog["url"] for blog in blogs],
+            page_timeout=FETCH_PAGE_TIMEOUT,
+            deadline=FETCH_DEADLINE
+        )
+        slimmed = slim_pages(pages)
         blogs_content = []
-        for blog in response['results']:
-            blog_url = blog.get("url", "")
-            if blog_url:
-                content = load_blog_content(blog_url)
-                if content:
-                    blogs_content.append({
-                        "title": blog.get("title", ""),
-                        "url": blog_url,
-                        "content": content,
-                        "score": blog.get("score", "")
-                    })
+        for blog in blogs:
+            page = slimmed.get(blog["url"])
+            if page and page["content"]:
+                blogs_content.append({
+                    "title": blog.get("title", ""),
+                    "url": blog["url"],
+                    "content_ref": put_blob(page["content"]),
+                    "score": blog.get("score", ""),
+                    "tokens_before": page["tokens_before"],
+                    "tokens_after": page["tokens_after"]
+                })
         
         if blogs_content:
-            print("Extracted Blogs Content:", blogs_content)
+            print(f"Extracted content from {len(blogs_content)} of {len(blogs)} sources.")
             return {"blogs_content": blogs_content}
         else:
             raise ValueError("No blogs content found.")
@@ -42,115 +95,296 @@ def tavily_search_node(state: State) -> Dict:
         print(f"Error with Tavily API call: {e}")
         return {"blogs_content": []}
 
-def schema_mapping_node(state: State) -> Dict:
-    """Map web search results to a structured schema."""
-    max_retries = 2
-    wait_time = 60
-    config = load_config()
-    llm = config["llm"]
-    
+def tavily_search_node(state: State) -> Dict:
+    """Search with Tavily and store content; concurrent runs with the same query share one search."""
+    return _sync_flights.do(query_key("search", state.get('query', '')), lambda: _tavily_search(state))
+
+async def atavily_search_node(state: State) -> Dict:
+    """Async variant of `tavily_search_node`."""
+    key = query_key("search", state.get('query', ''))
+    return await _flights.do(key, lambda: asyncio.to_thread(_tavily_search, state))
+
+def _extraction_chunks(state: State):
     if "blogs_content" not in state or not state["blogs_content"]:
         print("No blog content available or content is empty; schema extraction skipped.")
-        return {"product_schema": []}
+        return []
+    # Page text is loaded from the content store only for the duration of this node.
+    contents = {
+        blog.get("url"): get_blob(blog["content_ref"]) if blog.get("content_ref") else blog.get("content")
+        for blog in state["blogs_content"]
+    }
+    # A resumed run can outlive its blobs (BLOB_TTL, eviction); those pages are fetched again.
+    missing = [url for url, content in contents.items() if not content and url]
+    if missing:
+        print(f"Content for {len(missing)} source(s) is no longer in the content store; fetching again.")
+        contents.update(_refetch(missing))
+    blogs = []
+    for blog in state["blogs_content"]:
+        content = contents.get(blog.get("url"))
+        if content:
+            blogs.append({"title": blog.get("title", ""), "url": blog.get("url", ""), "content": content})
+        else:
+            print(f"Content for {blog.get('url')} could not be loaded; skipped.")
+    return chunk_blogs(blogs, EXTRACTION_CHUNK_TOKENS, EXTRACTION_MAX_TOKENS)
+
+def _refetch(urls) -> Dict[str, str]:
+    pages = load_blog_pages(urls, page_timeout=FETCH_PAGE_TIMEOUT, deadline=FETCH_DEADLINE)
+    return {url: page["content"] for url, page in slim_pages(pages).items() if page["content"]}
+
+def _emit_products(products) -> None:
+    """Stream newly extracted products to callers of `stream_workflow` as soon as their chunk completes."""
+    if not products:
+        return
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    for product in products:
+        writer({"type": "product_extracted", "product": ProductRecord.from_dict(product)})
+
+def _merged_schema(state: State, merger: ProductMerger) -> Dict:
+    _remember_products(get_store().upsert_reviews, merger.products())
+    # Products pre-filled from the store fill the gaps in what the web search found.
+    merger.add(state.get("product_schema") or [])
+    products = [ProductRecord.from_dict(product) for product in merger.products()]
+    # Extraction was the only reader of the page text, so the content handles are dropped here.
+    sources = [{"title": blog.get("title", ""), "url": blog.get("url", "")} for blog in state.get("blogs_content") or []]
+    if len(products) > 1:
+        return {"product_schema": products, "blogs_content": sources}
+    print("Schema extraction failed to find more than one product.")
+    return {"product_schema": [], "blogs_content": sources}
+
+def _schema_mapping(state: State) -> Dict:
+    llm = get_client("llm")
+    chunks = _extraction_chunks(state)
+    if not chunks:
+        return _merged_schema(state, ProductMerger())
+    
+    chain = get_chain("schema_mapping", llm)
+    
+    def extract(chunk):
+        inputs = {"blogs_content": [chunk]}
+        cache_key, cached = llm_cache.lookup(llm, prompt_template("schema_mapping"), inputs)
+        if cached is not None:
+            return cached
+        products = scheduler.call("groq", lambda: products_from_response(chain.invoke(inputs)))
+        # An empty answer is more likely a bad response than a page without phones; let the next run retry.
+        if products:
+            llm_cache.set(cache_key, products)
+        return products
     
-    blogs_content = state["blogs_content"]
-    prompt_template = """
-You are a professional assistant tasked with extracting structured information from a blogs.
+    merger = ProductMerger()
+    with ThreadPoolExecutor(max_workers=EXTRACTION_CONCURRENCY) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, extract, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            try:
+                _emit_products(merger.add(future.result()))
+            except Exception as e:
+                print(f"Schema extraction error: {e}")
+    return _merged_schema(state, merger)
 
-### Instructions:
+def _extraction_key(state: State) -> tuple:
+    sources = [(blog.get("url"), blog.get("content_ref") or blog.get("content")) for blog in state.get("blogs_content") or []]
+    products = [as_dict(product) for product in state.get("product_schema") or []]
+    return query_key("extraction", state.get('query', ''), sources, products)
 
-1. **Product Details**: For each product mentioned in the blog post, populate the `products` array with structured data for each item, including:
-   - `title`: The product name.
-   - `url`: Link to the blog post or relevant page.
-   - `content`: A concise summary of the product's main features or purpose.
-   - `pros`: A list of positive aspects or advantages of the product.if available other wise extract blog content.
-   - `cons`: A list of negative aspects or disadvantages.if available other wise extract blog content.
-   - `highlights`: A dictionary containing notable features or specifications.if available other wise extract blog content.
-   - `score`: A numerical rating score if available; otherwise, use `0.0`.
+def schema_mapping_node(state: State) -> Dict:
+    """Map web search results to a structured schema, extracting token-budgeted chunks in parallel.
 
-### Blogs Contents: {blogs_content}
+    Concurrent runs with the same query share one extraction.
+    """
+    return _sync_flights.do(_extraction_key(state), lambda: _schema_mapping(state))
 
-After extracting all information, just return the response in the JSON structure given below. Do not add any extracted information. The JSON should be in a valid structure with no extra characters inside, like Python’s \\n.
+async def aschema_mapping_node(state: State) -> Dict:
+    """Async variant of `schema_mapping_node`."""
+    return await _flights.do(_extraction_key(state), lambda: _aschema_mapping(state))
 
-"""
-    parser = JsonOutputParser(pydantic_object=ListOfSmartphoneReviews)
-    prompt = PromptTemplate(
-        template=prompt_template,
-        input_variables=["blogs_content"],
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
+async def _aschema_mapping(state: State) -> Dict:
+    # Content store, LLM cache and product store calls block on SQLite (and refetches on the network),
+    # so they run in threads rather than on the event loop shared by every consultation.
+    llm = get_client("llm")
+    chunks = await asyncio.to_thread(_extraction_chunks, state)
+    if not chunks:
+        return await asyncio.to_thread(_merged_schema, state, ProductMerger())
     
-    for attempt in range(1, max_retries + 1):
+    chain = get_chain("schema_mapping", llm)
+    semaphore = asyncio.Semaphore(EXTRACTION_CONCURRENCY)
+    
+    async def extract(chunk):
+        inputs = {"blogs_content": [chunk]}
+        cache_key, cached = await asyncio.to_thread(llm_cache.lookup, llm, prompt_template("schema_mapping"), inputs)
+        if cached is not None:
+            return cached
+        async with semaphore:
+            response = await scheduler.acall("groq", chain.ainvoke, inputs)
+        products = products_from_response(response)
+        if products:
+            await asyncio.to_thread(llm_cache.set, cache_key, products)
+        return products
+    
+    merger = ProductMerger()
+    for next_done in asyncio.as_completed([extract(chunk) for chunk in chunks]):
         try:
-            chain = prompt | llm | parser
-            response = chain.invoke({"blogs_content": blogs_content})
-            if response.get('products') and len(response['products']) > 1:
-                return {"product_schema": response['products']}
-            else:
-                print(f"Attempt {attempt} failed: Product schema has one or fewer products.")
-            if attempt < max_retries:
-                time.sleep(wait_time)
-        except Exception as retry_exception:
-            print(f"Retry {attempt} error: {retry_exception}")
-            if attempt < max_retries:
-                time.sleep(wait_time)
-    
-    print("All retry attempts failed to create a valid product schema with more than one product.")
-    return {"product_schema": []}
+            _emit_products(merger.add(await next_done))
+        except Exception as e:
+            print(f"Schema extraction error: {e}")
+    return await asyncio.to_thread(_merged_schema, state, merger)
+
+def _comparison_lookup(llm, product_schema):
+    product_data = json.dumps([as_dict(product) for product in product_schema])
+    cache_key, response = llm_cache.lookup(
+        llm, prompt_template("product_comparison"), {"product_data": product_data},
+        titles=[product.get("title", "") for product in product_schema]
+    )
+    return product_data, cache_key, response
+
+def _comparison_result(state: State, response: Dict) -> Dict:
+    return {
+        "comparison": [ComparisonRecord.from_dict(comparison) for comparison in response['comparisons']],
+        "best_product": response['best_product'],
+        "ranking": rank_products(response['comparisons'], state.get('query', ''))
+    }
+
+def _spec(value, unit: str) -> str:
+    return f"{value:g}{unit}" if value is not None else "Unknown"
+
+def _local_comparison(state: State):
+    """Rank products locally and build `Comparison` records plus the inputs for the justification prompt."""
+    product_schema = state["product_schema"]
+    ranking = rank_products(product_schema, state.get('query', ''))
+    ratings = feature_ratings(ranking)
+    products = {candidate_name(product): product for product in product_schema}
+    comparisons = []
+    for entry in ranking:
+        product = products.get(entry["product_name"], {})
+        features = entry["features"]
+        comparisons.append(ComparisonRecord(
+            product_name=entry["product_name"],
+            specs_comparison={
+                "processor": parse_processor(review_text(product)) or "Unknown",
+                "battery": _spec(features["battery_mah"], "mAh"),
+                "camera": _spec(features["camera_mp"], "MP"),
+                "display": _spec(features["refresh_hz"], "Hz"),
+                "storage": _spec(features["storage_gb"], "GB"),
+            },
+            ratings_comparison=ratings[entry["product_name"]],
+            reviews_summary=product.get("content") or ""
+        ))
+    best = ranking[0]
+    top_features = sorted(best["contributions"].items(), key=lambda item: -item[1])[:3]
+    inputs = {
+        "user_query": state.get('query', ''),
+        "product_name": best["product_name"],
+        "ranking": json.dumps([[entry["product_name"], entry["score"]] for entry in ranking[:5]]),
+        "product_notes": json.dumps({
+            "strongest_features": [feature for feature, _ in top_features],
+            "pros": products.get(best["product_name"], {}).get("pros") or [],
+            "summary": products.get(best["product_name"], {}).get("content") or ""
+        })
+    }
+    fallback = {
+        "product_name": best["product_name"],
+        "justification": f"Ranked first for this query on {', '.join(f.replace('_', ' ') for f, _ in top_features)}."
+    }
+    return ranking, comparisons, inputs, fallback
+
+def _has_justification(response) -> bool:
+    return isinstance(response, dict) and bool(response.get("justification"))
+
+def _justified(ranked: Dict, response) -> Dict:
+    """Best product of the local ranking with the LLM's justification; the LLM never changes which product won."""
+    justification = response["justification"] if _has_justification(response) else ranked["justification"]
+    return {"product_name": ranked["product_name"], "justification": justification}
+
+def _product_comparison(state: State) -> Dict:
+    llm = get_client("llm")
+    
+    if "product_schema" not in state or not state["product_schema"]:
+        print("No product schema available; product comparison skipped.")
+        return {}
+    
+    if RANKING_MODE == "local":
+        ranking, comparisons, inputs, best_product = _local_comparison(state)
+        cache_key, cached = llm_cache.lookup(llm, prompt_template("justification"), inputs)
+        if cached:
+            best_product = _justified(best_product, cached)
+        else:
+            try:
+                response = scheduler.call("groq", get_chain("justification", llm).invoke, inputs)
+                if _has_justification(response):
+                    best_product = _justified(best_product, response)
+                    llm_cache.set(cache_key, best_product)
+            except Exception as e:
+                print(f"Error generating justification; using ranking summary: {e}")
+        return {"comparison": comparisons, "best_product": best_product, "ranking": ranking}
+    
+    product_data, cache_key, response = _comparison_lookup(llm, state["product_schema"])
+    if response:
+        return _comparison_result(state, response)
+    
+    try:
+        chain = get_chain("product_comparison", llm)
+        response = scheduler.call("groq", chain.invoke, {"product_data": product_data})
+        result = _comparison_result(state, response)
+        llm_cache.set(cache_key, response)
+        _remember_products(get_store().upsert_comparisons, response['comparisons'])
+        return result
+    except Exception as e:
+        print(f"Error during product comparison: {e}")
+        return {"best_product": {}, "comparison_report": "Comparison failed"}
+
+def _comparison_key(state: State) -> tuple:
+    products = [as_dict(product) for product in state.get("product_schema") or []]
+    return query_key("comparison", state.get('query', ''), products)
 
 def product_comparison_node(state: State) -> Dict:
-    """Compare products and select the best one."""
-    config = load_config()
-    llm = config["llm"]
+    """Compare products and select the best one; concurrent runs with the same query share one comparison."""
+    return _sync_flights.do(_comparison_key(state), lambda: _product_comparison(state))
+
+async def aproduct_comparison_node(state: State) -> Dict:
+    """Async variant of `product_comparison_node`."""
+    return await _flights.do(_comparison_key(state), lambda: _aproduct_comparison(state))
+
+async def _aproduct_comparison(state: State) -> Dict:
+    llm = get_client("llm")
     
     if "product_schema" not in state or not state["product_schema"]:
         print("No product schema available; product comparison skipped.")
-        return state
+        return {}
     
-    product_schema = state["product_schema"]
-    prompt_template = """
-1. **List of Products for Comparison (`comparisons`):**
-   - Each product should include:
-     - **Product Name**: The name of the product (e.g., "Smartphone A").
-     - **Specs Comparison**:
-       - **Processor**: Type and model of the processor (e.g., "Snapdragon 888").
-       - **Battery**: Battery capacity and type (e.g., "4500mAh").
-       - **Camera**: Camera specifications (e.g., "108MP primary").
-       - **Display**: Display type, size, and refresh rate (e.g., "6.5 inch OLED, 120Hz").
-       - **Storage**: Storage options and whether it is expandable (e.g., "128GB, expandable").
-     - **Ratings Comparison**:
-       - **Overall Rating**: Overall rating out of 5 (e.g., 4.5).
-       - **Performance**: Rating for performance out of 5 (e.g., 4.7).
-       - **Battery Life**: Rating for battery life out of 5 (e.g., 4.3).
-       - **Camera Quality**: Rating for camera quality out of 5 (e.g., 4.6).
-       - **Display Quality**: Rating for display quality out of 5 (e.g., 4.8).
-     - **Reviews Summary**: Summary of key points from user reviews that highlight the strengths and weaknesses of this product.
-
-2. **Best Product Selection (`best_product`):**
-   - **Product Name**: Select the best product among the compared items.
-   - **Justification**: Provide a brief explanation of why this product is considered the best choice. This should be based on factors such as balanced performance, high user ratings, advanced specifications, or unique features.
-
-Here is the product data to analyze:\n\n{product_data}
-"""
-    parser = JsonOutputParser(pydantic_object=ProductComparison)
-    prompt = PromptTemplate(
-        template=prompt_template,
-        input_variables=["product_data"],
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
+    if RANKING_MODE == "local":
+        ranking, comparisons, inputs, best_product = _local_comparison(state)
+        cache_key, cached = await asyncio.to_thread(llm_cache.lookup, llm, prompt_template("justification"), inputs)
+        if cached:
+            best_product = _justified(best_product, cached)
+        else:
+            try:
+                response = await scheduler.acall("groq", get_chain("justification", llm).ainvoke, inputs)
+                if _has_justification(response):
+                    best_product = _justified(best_product, response)
+                    await asyncio.to_thread(llm_cache.set, cache_key, best_product)
+            except Exception as e:
+                print(f"Error generating justification; using ranking summary: {e}")
+        return {"comparison": comparisons, "best_product": best_product, "ranking": ranking}
+    
+    product_data, cache_key, response = await asyncio.to_thread(_comparison_lookup, llm, state["product_schema"])
+    if response:
+        return _comparison_result(state, response)
     
     try:
-        chain = prompt | llm | parser
-        response = chain.invoke({"product_data": json.dumps(state['product_schema'])})
-        return {"comparison": response['comparisons'], "best_product": response['best_product']}
+        chain = get_chain("product_comparison", llm)
+        response = await scheduler.acall("groq", chain.ainvoke, {"product_data": product_data})
+        result = _comparison_result(state, response)
+        await asyncio.to_thread(llm_cache.set, cache_key, response)
+        await asyncio.to_thread(lambda: _remember_products(get_store().upsert_comparisons, response['comparisons']))
+        return result
     except Exception as e:
         print(f"Error during product comparison: {e}")
         return {"best_product": {}, "comparison_report": "Comparison failed"}
 
 def youtube_review_node(state: State) -> Dict:
     """Search for a YouTube review of the best product."""
-    config = load_config()
-    youtube = config["youtube"]
+    youtube = get_client("youtube")
     
     best_product_name = state.get("best_product", {}).get("product_name")
     if not best_product_name:
@@ -158,12 +392,16 @@ def youtube_review_node(state: State) -> Dict:
         return {"youtube_link": None}
     
     try:
-        search_response = youtube.search().list(
+        search_request = youtube.search().list(
             q=f"{best_product_name} review",
             part="snippet",
             type="video",
             maxResults=1
-        ).execute()
+        )
+        # httplib2 connections are not thread-safe, so each thread executes on its own; clients
+        # whose requests carry no httplib2 transport (e.g. test fakes) do not need one built.
+        execute_kwargs = {"http": youtube_http()} if hasattr(search_request, "http") else {}
+        search_response = scheduler.call("youtube", search_request.execute, **execute_kwargs)
         
         video_items = search_response.get("items", [])
         if not video_items:
@@ -174,66 +412,112 @@ def youtube_review_node(state: State) -> Dict:
         youtube_link = f"https://www.youtube.com/watch?v={video_id}"
         return {"youtube_link": youtube_link}
     except Exception as e:
-        print(f"Error during YouTube search: {e}")
+        _step_failed("Error during YouTube search", e)
         return {"youtube_link": None}
 
+async def ayoutube_review_node(state: State) -> Dict:
+    """Async variant of `youtube_review_node`; runs for the same product share one lookup."""
+    best_product_name = state.get("best_product", {}).get("product_name")
+    if not best_product_name:
+        return youtube_review_node(state)
+    key = ("youtube", normalize_title(best_product_name))
+    return await _flights.do(key, lambda: asyncio.to_thread(youtube_review_node, state))
+
+def display_view(state: Dict) -> Dict:
+    """Shape (possibly partial) state into the data the UI renders."""
+    return {
+        "products": state.get("product_schema") or [],
+        "best_product": state.get("best_product") or {},
+        "comparison": state.get("comparison") or [],
+        "youtube_link": state.get("youtube_link")
+    }
+
+def render_event(view: Dict, event) -> Dict:
+    """Fold one streamed `WorkflowEvent` into a UI view so it can be rendered incrementally."""
+    view = dict(view or display_view({}))
+    if event.type == "product_extracted":
+        view["products"] = view["products"] + [event.data]
+    elif event.type == "products":
+        view["products"] = event.data
+    elif event.type == "comparison":
+        view["comparison"] = event.data
+    elif event.type == "best_product":
+        view["best_product"] = event.data
+    elif event.type == "youtube_link":
+        view["youtube_link"] = event.data
+    return view
+
 def display_node(state: State) -> Dict:
-    """Prepare data for UI display."""
-    if "comparison" in state and state['comparison']:
-        return {
-            "products": state["product_schema"],
-            "best_product": state["best_product"],
-            "comparison": state["comparison"],
-            "youtube_link": state["youtube_link"]
-        }
-    else:
+    """Check the result is displayable; the UI builds its view with `display_view` instead of copying state."""
+    if not state.get('comparison'):
         print("Comparison not available")
-        return state
+    return {}
 
-def send_email_node(state: State) -> Dict:
-    """Send email with product recommendation."""
-    from utils import send_email
-    from prompts import email_template_prompt, email_html_template
-    from config import load_config
-    from langchain_core.output_parsers import JsonOutputParser
-    from langchain_core.prompts import PromptTemplate
+def _email_inputs(state: State) -> Dict:
+    return {
+        "product_name": state["best_product"]["product_name"],
+        "justification_line": state["best_product"]["justification"],
+        "user_query": state["query"]
+    }
+
+def _send_recommendation(state: State, email_content: Dict) -> None:
+    email_body = email_html_template.format(
+        heading=email_content["heading"],
+        product_name=state["best_product"]["product_name"],
+        justification=email_content["justification_line"],
+        youtube_link=state.get("youtube_link", "")
+    )
+    # Keyed by run, so resuming or replaying a run never queues the same email twice.
+    idempotency_key = state.get("email_key") or (f"recommendation:{state['run_id']}" if state.get("run_id") else None)
+    send_email(state["email"], email_content["subject"], email_body, idempotency_key=idempotency_key)
+
+def _email_copy_skipped(state: State) -> bool:
+    if "best_product" not in state or not state['best_product']:
+        print("No best product available; email copy generation skipped.")
+        return True
+    return False
+
+def email_copy_node(state: State) -> Dict:
+    """Generate the recommendation email copy; runs alongside the YouTube search."""
+    if _email_copy_skipped(state):
+        return {"email_content": {}}
     
-    config = load_config()
-    llm = config["llm"]
+    try:
+        chain = get_chain("email", get_client("llm"))
+        return {"email_content": scheduler.call("groq", chain.invoke, _email_inputs(state))}
+    except Exception as e:
+        print(f"Error generating email copy: {e}")
+        return {"email_content": {}}
+
+async def aemail_copy_node(state: State) -> Dict:
+    """Async variant of `email_copy_node`."""
+    if _email_copy_skipped(state):
+        return {"email_content": {}}
     
+    try:
+        chain = get_chain("email", get_client("llm"))
+        return {"email_content": await scheduler.acall("groq", chain.ainvoke, _email_inputs(state))}
+    except Exception as e:
+        print(f"Error generating email copy: {e}")
+        return {"email_content": {}}
+
+def send_email_node(state: State) -> Dict:
+    """Queue the product recommendation email; delivery happens in the mailer's background workers."""
     if "best_product" not in state or not state['best_product']:
         print("No best product available; email sending skipped.")
-        return {"send_email": None}
-    
-    user_query = state["query"]
-    best_product_name = state["best_product"]["product_name"]
-    justification = state["best_product"]["justification"]
-    youtube_link = state.get("youtube_link", "")
-    
-    parser = JsonOutputParser(pydantic_object=EmailRecommendation)
-    prompt = PromptTemplate(
-        template=email_template_prompt,
-        input_variables=["product_name", "justification_line", "user_query"],
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
+        return {}
+    
+    email_content = state.get("email_content")
+    if not email_content:
+        print("No email copy available; email sending skipped.")
+        return {}
     
     try:
-        chain = prompt | llm | parser
-        email_content = chain.invoke({
-            "product_name": best_product_name,
-            "justification_line": justification,
-            "user_query": user_query
-        })
-        
-        email_body = email_html_template.format(
-            heading=email_content["heading"],
-            product_name=best_product_name,
-            justification=email_content["justification_line"],
-            youtube_link=youtube_link
-        )
-        
-        send_email(state["email"], email_content["subject"], email_body)
-        return {"send_email": None}
+        _send_recommendation(state, email_content)
     except Exception as e:
-        print(f"Error sending email: {e}")
-        return {"send_email": None}
\ No newline at end of file
+        _step_failed("Error queueing email", e)
+    return {}
+
+async def asend_email_node(state: State) -> Dict:
+    """Async variant of `send_email_node`."""
+    return await asyncio.to_thread(send_email_node, state)
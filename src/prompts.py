@@ -1,4 +1,66 @@
 # prompts.py
+schema_mapping_prompt = """
+You are a professional assistant tasked with extracting structured information from a blogs.
+
+### Instructions:
+
+1. **Product Details**: For each product mentioned in the blog post, populate the `products` array with structured data for each item, including:
+   - `title`: The product name.
+   - `url`: Link to the blog post or relevant page.
+   - `content`: A concise summary of the product's main features or purpose.
+   - `pros`: A list of positive aspects or advantages of the product.if available other wise extract blog content.
+   - `cons`: A list of negative aspects or disadvantages.if available other wise extract blog content.
+   - `highlights`: A dictionary containing notable features or specifications.if available other wise extract blog content.
+   - `score`: A numerical rating score if available; otherwise, use `0.0`.
+
+### Blogs Contents: {blogs_content}
+
+After extracting all information, just return the response in the JSON structure given below. Do not add any extracted information. The JSON should be in a valid structure with no extra characters inside, like Python’s \\n.
+
+{format_instructions}
+"""
+
+product_comparison_prompt = """
+1. **List of Products for Comparison (`comparisons`):**
+   - Each product should include:
+     - **Product Name**: The name of the product (e.g., "Smartphone A").
+     - **Specs Comparison**:
+       - **Processor**: Type and model of the processor (e.g., "Snapdragon 888").
+       - **Battery**: Battery capacity and type (e.g., "4500mAh").
+       - **Camera**: Camera specifications (e.g., "108MP primary").
+       - **Display**: Display type, size, and refresh rate (e.g., "6.5 inch OLED, 120Hz").
+       - **Storage**: Storage options and whether it is expandable (e.g., "128GB, expandable").
+     - **Ratings Comparison**:
+       - **Overall Rating**: Overall rating out of 5 (e.g., 4.5).
+       - **Performance**: Rating for performance out of 5 (e.g., 4.7).
+       - **Battery Life**: Rating for battery life out of 5 (e.g., 4.3).
+       - **Camera Quality**: Rating for camera quality out of 5 (e.g., 4.6).
+       - **Display Quality**: Rating for display quality out of 5 (e.g., 4.8).
+     - **Reviews Summary**: Summary of key points from user reviews that highlight the strengths and weaknesses of this product.
+
+2. **Best Product Selection (`best_product`):**
+   - **Product Name**: Select the best product among the compared items.
+   - **Justification**: Provide a brief explanation of why this product is considered the best choice. This should be based on factors such as balanced performance, high user ratings, advanced specifications, or unique features.
+
+Return the response as JSON in this format:
+{format_instructions}
+
+Here is the product data to analyze:\n\n{product_data}
+"""
+
+justification_prompt = """
+You are a smartphone expert. A scoring engine has already ranked the candidate phones for the user's request.
+Explain in two or three sentences why the top-ranked phone is the best choice for this user.
+
+- User Query: "{user_query}"
+- Top-ranked Product: {product_name}
+- Ranking (product, score): {ranking}
+- Notes on the top product: {product_notes}
+
+Return only JSON with `product_name` (exactly "{product_name}") and `justification`:
+{format_instructions}
+"""
+
 email_template_prompt = """
 You are an expert email content writer.
 
@@ -25,6 +87,41 @@ User Query: a phone with an amazing camera
 Now generate the email recommendation based on the inputs provided.
 """
 
+# Compact variants (PROMPT_STYLE=compact): the same tasks without the long instruction blocks.
+schema_mapping_prompt_compact = """
+Extract every smartphone reviewed in the blog text below. For each give title, url, content (short feature summary),
+pros, cons, highlights (key specs) and score (0.0 if none). Use only information from the text.
+{format_instructions}
+
+Blogs: {blogs_content}
+"""
+
+product_comparison_prompt_compact = """
+Compare these smartphones. For each give product_name, specs_comparison (processor, battery, camera, display, storage),
+ratings_comparison (0-5: overall_rating, performance, battery_life, camera_quality, display_quality) and reviews_summary.
+Then pick best_product with a short justification.
+{format_instructions}
+
+Products: {product_data}
+"""
+
+justification_prompt_compact = """
+Justify in 2-3 sentences why the top-ranked phone suits this user.
+User Query: "{user_query}"
+Top-ranked Product: {product_name}
+Ranking: {ranking}
+Notes: {product_notes}
+{format_instructions}
+"""
+
+email_template_prompt_compact = """
+Write recommendation email copy: a catchy subject, a heading and a one-sentence justification_line.
+Product Name: {product_name}
+Reason: {justification_line}
+User Query: "{user_query}"
+{format_instructions}
+"""
+
 email_html_template = """
 <html>
 <head>
@@ -0,0 +1,158 @@
+# ranking.py
+import re
+import warnings
+from typing import Dict, List, Optional
+import numpy as np
+from specs import (
+    parse_battery_mah, parse_refresh_hz, parse_camera_mp, parse_storage_gb, parse_processor, parse_price_usd,
+    chipset_tier, review_text, query_filters
+)
+
+FEATURES = [
+    "battery_mah", "refresh_hz", "camera_mp", "storage_gb", "chipset_tier",
+    "overall_rating", "performance", "battery_life", "camera_quality", "display_quality", "review_score",
+]
+
+BASE_WEIGHTS = {
+    "battery_mah": 0.6, "refresh_hz": 0.5, "camera_mp": 0.4, "storage_gb": 0.3, "chipset_tier": 0.8,
+    "overall_rating": 1.5, "performance": 0.6, "battery_life": 0.6, "camera_quality": 0.6,
+    "display_quality": 0.5, "review_score": 1.0,
+}
+
+# Score multiplier for candidates priced above the query's budget; they also rank after every affordable one.
+OVER_BUDGET_PENALTY = 0.25
+
+# Query keywords -> feature weight multipliers.
+QUERY_BOOSTS = [
+    (r"camera|photo|video|selfie|vlog", {"camera_mp": 2.5, "camera_quality": 3.0}),
+    (r"battery|endurance|all[- ]day|long[- ]lasting", {"battery_mah": 3.0, "battery_life": 3.0}),
+    (r"gaming|game|performance|fast|power", {"chipset_tier": 3.0, "performance": 3.0, "refresh_hz": 2.0}),
+    (r"display|screen|movie|stream|media", {"refresh_hz": 2.0, "display_quality": 3.0}),
+    (r"storage|space|memory", {"storage_gb": 3.0}),
+]
+
+
+def query_weights(query: str) -> np.ndarray:
+    """Feature weights for a user query, boosting the aspects it mentions."""
+    weights = dict(BASE_WEIGHTS)
+    for pattern, boosts in QUERY_BOOSTS:
+        if re.search(pattern, query or "", re.IGNORECASE):
+            for feature, factor in boosts.items():
+                weights[feature] *= factor
+    vector = np.array([weights[feature] for feature in FEATURES], dtype=float)
+    return vector / vector.sum()
+
+
+def _rating(ratings: Dict, key: str) -> float:
+    try:
+        return float(ratings.get(key))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def candidate_features(candidate: Dict) -> List[float]:
+    """Raw feature row for a `Comparison` dict or an extracted `SmartphoneReview` dict (NaN when unknown)."""
+    specs = candidate.get("specs_comparison") or {}
+    ratings = candidate.get("ratings_comparison") or {}
+    text = review_text(candidate)
+
+    def spec(field, parser):
+        value = parser(specs.get(field) or "") if specs else None
+        if value is None:
+            value = parser(text)
+        return np.nan if value is None else value
+
+    processor = specs.get("processor") or parse_processor(text)
+    tier = chipset_tier(processor)
+    return [
+        spec("battery", parse_battery_mah),
+        spec("display", parse_refresh_hz),
+        spec("camera", parse_camera_mp),
+        spec("storage", parse_storage_gb),
+        np.nan if tier is None else tier,
+        _rating(ratings, "overall_rating"),
+        _rating(ratings, "performance"),
+        _rating(ratings, "battery_life"),
+        _rating(ratings, "camera_quality"),
+        _rating(ratings, "display_quality"),
+        _rating(candidate, "score"),
+    ]
+
+
+def candidate_price(candidate: Dict) -> Optional[float]:
+    """Dollar price from the candidate's own specs, else the one its review text states next to its name.
+
+    Discount amounts ('$100 off') are not prices; None when the candidate states none.
+    """
+    specs = candidate.get("specs_comparison") or {}
+    return (parse_price_usd(" ".join(str(value) for value in specs.values() if value))
+            or parse_price_usd(review_text(candidate), candidate_name(candidate)))
+
+
+def candidate_name(candidate: Dict) -> str:
+    return candidate.get("product_name") or candidate.get("title") or ""
+
+
+def normalize_features(matrix: np.ndarray) -> np.ndarray:
+    """Min-max scale each column to [0, 1]; unknown values get the column mean, all-unknown columns 0."""
+    with warnings.catch_warnings(), np.errstate(all="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low = np.nanmin(matrix, axis=0)
+        high = np.nanmax(matrix, axis=0)
+        span = np.where(high > low, high - low, 1.0)
+        scaled = (matrix - low) / span
+        # A column with a single distinct known value carries no ranking signal beyond presence.
+        scaled = np.where(high > low, scaled, np.where(np.isnan(matrix), np.nan, 1.0))
+        fill = np.nan_to_num(np.nanmean(scaled, axis=0), nan=0.0)
+    return np.where(np.isnan(scaled), fill, scaled)
+
+
+def rank_products(candidates: List[Dict], query: str = "") -> List[Dict]:
+    """Score every candidate in one vectorized pass; returns candidates best first with per-feature contributions.
+
+    When the query names a budget, candidates with a known price above it are penalized and ranked after
+    every candidate within budget (or of unknown price).
+    """
+    if not candidates:
+        return []
+    raw = np.array([candidate_features(candidate) for candidate in candidates], dtype=float)
+    normalized = normalize_features(raw)
+    contributions = normalized * query_weights(query)
+    scores = contributions.sum(axis=1)
+    max_price = query_filters(query)["max_price"]
+    prices = [candidate_price(candidate) for candidate in candidates]
+    over_budget = np.array([bool(max_price and price and price > max_price) for price in prices])
+    scores = np.where(over_budget, scores * OVER_BUDGET_PENALTY, scores)
+    order = np.lexsort((-scores, over_budget))
+    return [
+        {
+            "product_name": candidate_name(candidates[i]),
+            "score": round(float(scores[i]), 4),
+            "rank": rank + 1,
+            "price_usd": prices[i],
+            "over_budget": bool(over_budget[i]),
+            "contributions": {feature: round(float(contributions[i, j]), 4) for j, feature in enumerate(FEATURES)},
+            "features": {feature: None if np.isnan(raw[i, j]) else float(raw[i, j]) for j, feature in enumerate(FEATURES)},
+            "normalized": {feature: round(float(normalized[i, j]), 4) for j, feature in enumerate(FEATURES)},
+        }
+        for rank, i in enumerate(order)
+    ]
+
+
+def feature_ratings(ranking: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """Deterministic 0-5 `RatingsComparison` values derived from the ranking, keyed by product name."""
+    def rating(entry, *features):
+        known = [entry["normalized"][f] for f in features if entry["features"][f] is not None]
+        return round(5 * float(np.mean(known)), 1) if known else 2.5
+
+    top = max((entry["score"] for entry in ranking), default=0.0) or 1.0
+    return {
+        entry["product_name"]: {
+            "overall_rating": round(5 * entry["score"] / top, 1),
+            "performance": rating(entry, "chipset_tier", "performance"),
+            "battery_life": rating(entry, "battery_mah", "battery_life"),
+            "camera_quality": rating(entry, "camera_mp", "camera_quality"),
+            "display_quality": rating(entry, "refresh_hz", "display_quality"),
+        }
+        for entry in ranking
+    }
@@ -0,0 +1,187 @@
+# scheduler.py
+import asyncio
+import email.utils
+import inspect
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.exceptions import OutputParserException
+from telemetry import span
+
+# Requests per minute allowed for each provider.
+PROVIDER_RATES = {
+    "groq": float(os.getenv("GROQ_RPM", "30")),
+    "tavily": float(os.getenv("TAVILY_RPM", "60")),
+    "youtube": float(os.getenv("YOUTUBE_RPM", "100")),
+    "smtp": float(os.getenv("SMTP_RPM", "60")),
+}
+
+
+class IncompleteResult(ValueError):
+    """Raised when a call succeeded but its parsed result is unusable; retried immediately."""
+
+
+class RetryPolicy:
+    """How many times to try a call and how long to back off between transient failures."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (1-based) attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class TokenBucket:
+    """Thread-safe token bucket; `reserve` returns how long the caller must wait for its token."""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, rate_per_minute / 10.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller of this provider, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for candidate in (error, getattr(error, "response", None), getattr(error, "resp", None)):
+        for attr in ("status_code", "status"):
+            value = getattr(candidate, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds requested by a Retry-After header on the error's response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "resp", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def classify(error: BaseException) -> str:
+    """Return 'parse', 'transient' or 'fatal' for an exception raised by a provider call."""
+    if isinstance(error, (IncompleteResult, OutputParserException)):
+        return "parse"
+    status = _status_code(error)
+    if status is not None:
+        return "transient" if status == 429 or status >= 500 else "fatal"
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return "transient"
+    name = type(error).__name__
+    if "Timeout" in name or "Connection" in name or "RateLimit" in name:
+        return "transient"
+    return "fatal"
+
+
+class Scheduler:
+    """Shared rate limiting and retry for all LLM and API calls."""
+
+    def __init__(self, rates: Dict[str, float] = PROVIDER_RATES):
+        self.buckets = {provider: TokenBucket(rate) for provider, rate in rates.items()}
+        self.default_policy = RetryPolicy()
+
+    def configure(self, provider: str, rate_per_minute: float, burst: Optional[float] = None) -> None:
+        self.buckets[provider] = TokenBucket(rate_per_minute, burst)
+
+    def _delay_after(self, provider: str, error: BaseException, attempt: int, policy: RetryPolicy) -> Optional[float]:
+        """Delay before the next attempt, or None when the error should not be retried."""
+        if attempt >= policy.max_attempts:
+            return None
+        kind = classify(error)
+        if kind == "parse":
+            return 0.0
+        if kind == "fatal":
+            return None
+        delay = retry_after(error)
+        if delay is not None:
+            # Other callers hold back for at most max_delay; a longer requested wait fails this call instead
+            # of outliving the run (or the service job) that made it.
+            if provider in self.buckets:
+                self.buckets[provider].pause(min(delay, policy.max_delay))
+            if delay > policy.max_delay:
+                print(f"{provider} asked to retry after {delay:.0f}s (more than {policy.max_delay:.0f}s); giving up.")
+                return None
+            return delay
+        return policy.backoff(attempt)
+
+    def call(self, provider: str, fn: Callable[..., Any], *args, policy: Optional[RetryPolicy] = None, **kwargs) -> Any:
+        """Run `fn` under the provider's rate limit, retrying per `policy`; blocks only this thread."""
+        policy = policy or self.default_policy
+        attempt = 0
+        with span(provider, retries=0, wait_ms=0.0) as attrs:
+            while True:
+                attempt += 1
+                if provider in self.buckets:
+                    wait = self.buckets[provider].reserve()
+                    if wait > 0:
+                        attrs["wait_ms"] += wait * 1000
+                        time.sleep(wait)
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    delay = self._delay_after(provider, e, attempt, policy)
+                    if delay is None:
+                        raise
+                    attrs["retries"] += 1
+                    print(f"{provider} call failed on attempt {attempt} ({e}); retrying in {delay:.1f}s.")
+                    if delay > 0:
+                        attrs["wait_ms"] += delay * 1000
+                        time.sleep(delay)
+
+    async def acall(self, provider: str, fn: Callable[..., Any], *args, policy: Optional[RetryPolicy] = None, **kwargs) -> Any:
+        """Async variant of `call`; waiting yields to the event loop instead of blocking it."""
+        policy = policy or self.default_policy
+        attempt = 0
+        with span(provider, retries=0, wait_ms=0.0) as attrs:
+            while True:
+                attempt += 1
+                if provider in self.buckets:
+                    wait = self.buckets[provider].reserve()
+                    if wait > 0:
+                        attrs["wait_ms"] += wait * 1000
+                        await asyncio.sleep(wait)
+                try:
+                    result = fn(*args, **kwargs)
+                    if inspect.isawaitable(result):
+                        result = await result
+                    return result
+                except Exception as e:
+                    delay = self._delay_after(provider, e, attempt, policy)
+                    if delay is None:
+                        raise
+                    attrs["retries"] += 1
+                    print(f"{provider} call failed on attempt {attempt} ({e}); retrying in {delay:.1f}s.")
+                    if delay > 0:
+                        attrs["wait_ms"] += delay * 1000
+                        await asyncio.sleep(delay)
+
+scheduler = Scheduler()
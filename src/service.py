@@ -0,0 +1,358 @@
+# service.py
+"""Consultations as a local HTTP API, run by a pool of worker processes.
+
+    python service.py --port 8000 --workers 4
+
+    POST /consultations {"query": "...", "email": "..."}  -> 202 {"job_id": ..., "status": "queued"}
+    GET  /consultations/<job_id>                         -> job status, with the result once done
+    GET  /health                                         -> live workers and job counts by status
+
+A full queue answers 429 with Retry-After; a draining service answers 503. SIGTERM or Ctrl+C stops
+accepting jobs, waits for queued and running ones (up to SERVICE_DRAIN_TIMEOUT) and stops the workers.
+Provider rate limits (GROQ_RPM, TAVILY_RPM, ...) apply to the service as a whole: each worker gets an
+equal share. Workers only queue emails; the service process runs the single mailer that delivers them.
+Each job runs under its job id as run id, so a job that timed out or lost its worker can be resumed
+from its checkpoints with `run_workflow(query, email, run_id=job_id)`.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", str(os.cpu_count() or 2)))
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "100"))
+SERVICE_JOB_TIMEOUT = float(os.getenv("SERVICE_JOB_TIMEOUT", "300"))
+SERVICE_DRAIN_TIMEOUT = float(os.getenv("SERVICE_DRAIN_TIMEOUT", "120"))
+SERVICE_JOB_RETENTION = float(os.getenv("SERVICE_JOB_RETENTION", "3600"))
+
+FINISHED = ("done", "failed", "timed_out")
+
+
+def _worker_main(jobs, results, initializer=None, workers: int = 1) -> None:
+    """Worker process: warm clients and the graph once, then run jobs until the drain sentinel."""
+    # Ctrl+C reaches the whole process group; only the service process handles it, by draining.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if initializer is not None:
+        initializer()
+    from config import registry
+    from mailer import Mailer
+    from scheduler import PROVIDER_RATES, scheduler
+    # Provider quotas are per account, not per process.
+    for provider, rate in PROVIDER_RATES.items():
+        scheduler.configure(provider, rate / workers)
+    # Mail goes to the shared outbox; delivery is left to the service process.
+    registry.register("mailer", Mailer)
+    import main
+    from models import as_dict
+    from nodes import display_view
+
+    try:
+        main.warm_up()
+    except Exception as e:
+        # Clients that could not be built now are built lazily by the first job that needs them.
+        print(f"Worker {os.getpid()} warm-up incomplete: {e}")
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            job_id, query, email = job
+            results.put((job_id, "running", {"pid": os.getpid()}))
+            try:
+                state = main.run_workflow(query, email, run_id=job_id)
+                view = display_view(state)
+                result = {
+                    "best_product": view["best_product"],
+                    "ranking": [{key: entry[key] for key in ("product_name", "score", "rank")} for entry in state.get("ranking") or []],
+                    "comparison": [as_dict(comparison) for comparison in view["comparison"]],
+                    "products": [as_dict(product) for product in view["products"]],
+                    "youtube_link": view["youtube_link"],
+                }
+                results.put((job_id, "done", {"result": result}))
+            except Exception as e:
+                results.put((job_id, "failed", {"error": repr(e)}))
+    finally:
+        main.shutdown()
+
+
+class Job:
+    """Status of one consultation as seen by the service."""
+
+    __slots__ = ("id", "query", "email", "status", "submitted_at", "started_at", "finished_at", "pid", "result", "error")
+
+    def __init__(self, query: str, email: str):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.email = email
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.pid = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__ if name != "email"}
+
+
+class QueueFull(Exception):
+    """The job queue is at capacity; the client should retry later."""
+
+
+class Draining(Exception):
+    """The service is shutting down and no longer accepts jobs."""
+
+
+class WorkerPool:
+    """Bounded job queue served by worker processes, with per-job timeouts and crash replacement."""
+
+    def __init__(self, workers: int = SERVICE_WORKERS, queue_size: int = SERVICE_QUEUE_SIZE,
+                 job_timeout: float = SERVICE_JOB_TIMEOUT, initializer: Optional[Callable[[], None]] = None):
+        # Spawned workers never inherit locks or client connections from this process.
+        self._mp = multiprocessing.get_context("spawn")
+        self.size = workers
+        self.job_timeout = job_timeout
+        # Runs first in every worker process, e.g. to register custom clients (like ProcessPoolExecutor's).
+        self.initializer = initializer
+        self._jobs_queue = self._mp.Queue(maxsize=queue_size)
+        self._results = self._mp.Queue()
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._draining = threading.Event()
+        self._stopped = threading.Event()
+        self.mailer = None
+
+    def start(self) -> "WorkerPool":
+        from mailer import Mailer
+        self.mailer = Mailer().start()
+        for _ in range(self.size):
+            self._spawn()
+        threading.Thread(target=self._collect, name="service-results", daemon=True).start()
+        threading.Thread(target=self._monitor, name="service-monitor", daemon=True).start()
+        return self
+
+    def _spawn(self) -> None:
+        process = self._mp.Process(target=_worker_main, args=(self._jobs_queue, self._results, self.initializer, self.size),
+                                    daemon=True)
+        process.start()
+        self._processes[process.pid] = process
+
+    def submit(self, query: str, email: str) -> Job:
+        if self._draining.is_set():
+            raise Draining()
+        job = Job(query, email)
+        with self._lock:
+            self.jobs[job.id] = job
+        try:
+            self._jobs_queue.put_nowait((job.id, query, email))
+        except queue.Full:
+            with self._lock:
+                self.jobs.pop(job.id, None)
+            raise QueueFull() from None
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _finish(self, job: Job, status: str, **fields) -> None:
+        if job.status in FINISHED:
+            return
+        job.status = status
+        job.finished_at = time.time()
+        for name, value in fields.items():
+            setattr(job, name, value)
+
+    def _collect(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                job_id, status, fields = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is None or job.status in FINISHED:
+                    continue
+                if status == "running":
+                    job.status, job.started_at, job.pid = "running", time.time(), fields["pid"]
+                else:
+                    self._finish(job, status, **fields)
+            if status == "done" and self.mailer is not None:
+                # The worker queued its email from another process; deliver it now rather than at the next poll.
+                self.mailer.notify()
+
+    def _monitor(self) -> None:
+        """Time out stuck jobs and replace workers that crashed or were stopped for a timeout."""
+        while not self._stopped.is_set():
+            time.sleep(1.0)
+            now = time.time()
+            with self._lock:
+                running = [job for job in self.jobs.values() if job.status == "running"]
+                for job in running:
+                    process = self._processes.get(job.pid)
+                    if process is not None and not process.is_alive():
+                        self._finish(job, "failed", error=f"Worker {job.pid} exited with code {process.exitcode}.")
+                    elif now - job.started_at > self.job_timeout:
+                        self._finish(job, "timed_out", error=f"No result within {self.job_timeout:.0f}s.")
+                        if process is not None:
+                            process.terminate()
+                            process.join(5)
+                for pid, process in list(self._processes.items()):
+                    if not process.is_alive():
+                        del self._processes[pid]
+                        if not self._draining.is_set():
+                            print(f"Worker {pid} exited with code {process.exitcode}; starting a replacement.")
+                            self._spawn()
+                expired = [job_id for job_id, job in self.jobs.items()
+                           if job.status in FINISHED and now - job.finished_at > SERVICE_JOB_RETENTION]
+                for job_id in expired:
+                    del self.jobs[job_id]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "workers": sum(process.is_alive() for process in self._processes.values()),
+                "draining": self._draining.is_set(),
+                "jobs": counts,
+            }
+
+    @property
+    def draining(self) -> bool:
+        return self._draining.is_set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def begin_drain(self) -> None:
+        """Refuse new jobs from now on."""
+        self._draining.set()
+
+    def drain(self, timeout: float = SERVICE_DRAIN_TIMEOUT) -> bool:
+        """Stop accepting jobs, wait for queued and running ones, then stop the workers."""
+        self.begin_drain()
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pending = any(job.status not in FINISHED for job in self.jobs.values())
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(0.2)
+        finished = not pending
+        with self._lock:
+            processes = list(self._processes.values())
+        for _ in processes:
+            try:
+                self._jobs_queue.put(None, timeout=1)
+            except queue.Full:
+                break
+        for process in processes:
+            process.join(max(1.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        if self.mailer is not None:
+            self.mailer.close()
+        self._stopped.set()
+        return finished
+
+
+def _handler(pool: WorkerPool):
+    class ConsultationHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: Dict, headers: Optional[Dict] = None) -> None:
+            payload = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/consultations":
+                return self._send(404, {"error": "Not found."})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                query, email = body["query"].strip(), body["email"].strip()
+                if not query or not email:
+                    raise ValueError
+            except (ValueError, KeyError, AttributeError, TypeError):
+                return self._send(400, {"error": "Expected a JSON body with non-empty 'query' and 'email'."})
+            try:
+                job = pool.submit(query, email)
+            except QueueFull:
+                return self._send(429, {"error": "Job queue is full."}, {"Retry-After": "5"})
+            except Draining:
+                return self._send(503, {"error": "Service is shutting down."})
+            self._send(202, {"job_id": job.id, "status": job.status}, {"Location": f"/consultations/{job.id}"})
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                return self._send(200, pool.stats())
+            prefix = "/consultations/"
+            job = pool.get(self.path[len(prefix):].rstrip("/")) if self.path.startswith(prefix) else None
+            if job is None:
+                return self._send(404, {"error": "Unknown job."})
+            self._send(200, job.to_dict())
+
+        def log_message(self, format, *args):
+            pass
+
+    return ConsultationHandler
+
+
+def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT, workers: int = SERVICE_WORKERS,
+          queue_size: int = SERVICE_QUEUE_SIZE, job_timeout: float = SERVICE_JOB_TIMEOUT,
+          initializer: Optional[Callable[[], None]] = None) -> None:
+    """Run the HTTP API until SIGTERM or Ctrl+C, then drain."""
+    pool = WorkerPool(workers, queue_size, job_timeout, initializer).start()
+    server = ThreadingHTTPServer((host, port), _handler(pool))
+    server.daemon_threads = True
+
+    def drain_then_stop():
+        if not pool.drain():
+            print("Drain timed out; unfinished jobs can be resumed from their checkpoints.")
+        server.shutdown()
+
+    def stop(signum, frame):
+        if pool.draining:
+            return
+        print("Draining consultations before shutdown...")
+        # Status polling keeps working while draining; serve_forever must be stopped from another thread.
+        pool.begin_drain()
+        threading.Thread(target=drain_then_stop, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Serving consultations on http://{host}:{server.server_address[1]} with {workers} workers.")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if not pool.stopped:
+            pool.drain(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Smartphone Consultant consultations over HTTP.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE)
+    parser.add_argument("--job-timeout", type=float, default=SERVICE_JOB_TIMEOUT)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.queue_size, args.job_timeout)
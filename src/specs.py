@@ -0,0 +1,295 @@
+# specs.py
+import re
+from typing import Dict, List, Optional, Tuple
+
+_NUMBER = r"(\d+(?:[.,]\d+)?)"
+_BATTERY = re.compile(_NUMBER + r"\s*mah", re.IGNORECASE)
+_REFRESH = re.compile(_NUMBER + r"\s*hz", re.IGNORECASE)
+_CAMERA = re.compile(_NUMBER + r"\s*mp", re.IGNORECASE)
+_STORAGE = re.compile(_NUMBER + r"\s*(gb|tb)", re.IGNORECASE)
+_PRICE = re.compile(r"\$\s*(\d[\d,]*(?:\.\d+)?)")
+# Amounts taken off a price rather than prices: "save $200", "knocks $100 off", "a $150 discount".
+_DISCOUNT_BEFORE = re.compile(
+    r"\b(?:save|saves|saving|savings|discount(?:ed)?|knocks?|knocking|takes?|rebate|cashback|coupon|credit|trade[- ]in)"
+    r"(?:\s+(?:of|by|up to|an extra|an additional|another))*\s*$",
+    re.IGNORECASE
+)
+_DISCOUNT_AFTER = re.compile(r"\s*(?:off\b|discount|savings?\b|cheaper\b|less\b|rebate|cashback|credit\b|coupon)", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"[.!?](?=\s|$)")
+# A budget needs a currency marker ("$800", "800 dollars") or a "k" suffix ("1k"); a bare number is a spec
+# ("up to 12GB RAM", "within 2 years"), not a price.
+_MAX_PRICE = re.compile(
+    r"\b(?:under|below|less than|up to|max(?:imum)?|within)\s*(\$)?\s*(\d[\d,]*(?:\.\d+)?)\s*(?:(k)\b|(usd|dollars?|bucks)\b)?",
+    re.IGNORECASE
+)
+_UNIT_AFTER = re.compile(r"\s*(?:[kmgt]b|mah|hz|mp|w\b|watts?|inch|\"|years?|months?|days?|hours?)", re.IGNORECASE)
+
+# Keyword -> brand; checked in order so product lines win over generic brand names.
+BRANDS = [
+    ("iphone", "Apple"), ("apple", "Apple"),
+    ("galaxy", "Samsung"), ("samsung", "Samsung"),
+    ("pixel", "Google"), ("google", "Google"),
+    ("oneplus", "OnePlus"), ("nothing phone", "Nothing"),
+    ("redmi", "Xiaomi"), ("poco", "Xiaomi"), ("xiaomi", "Xiaomi"),
+    ("moto", "Motorola"), ("motorola", "Motorola"),
+    ("xperia", "Sony"), ("sony", "Sony"),
+    ("oppo", "Oppo"), ("vivo", "Vivo"), ("iqoo", "Vivo"), ("realme", "Realme"),
+    ("honor", "Honor"), ("huawei", "Huawei"), ("asus", "Asus"), ("rog phone", "Asus"), ("zenfone", "Asus"),
+    ("nokia", "Nokia"), ("tecno", "Tecno"), ("infinix", "Infinix"),
+]
+
+_PROCESSOR = re.compile(
+    r"\b(snapdragon\s*\d+\s*(?:\+\s*)?(?:gen\s*\d+|elite)?|dimensity\s*\d+|tensor\s*g\d|exynos\s*\d+|"
+    r"apple\s*a\d{2}(?:\s*(?:pro|bionic))?|a\d{2}\s*(?:pro|bionic)|helio\s*[a-z]?\d+|kirin\s*\d+)",
+    re.IGNORECASE
+)
+
+# (pattern, tier): first match wins; tiers run from 1 (entry) to 5 (current flagship).
+CHIPSET_TIERS = [
+    (r"snapdragon\s*8\s*(elite|gen\s*[3-9])|dimensity\s*9[3-9]\d\d|tensor\s*g[4-9]|exynos\s*2[5-9]\d\d|\ba(1[7-9]|2\d)\b", 5),
+    (r"snapdragon\s*(8\s*\+?\s*gen\s*[12]|888|8\d\d)|dimensity\s*9[0-2]\d\d|tensor\s*g[23]|exynos\s*2[0-4]\d\d|\ba1[56]\b|kirin\s*9\d\d\d", 4),
+    (r"snapdragon\s*(7\s*\+?\s*gen\s*\d|7\d\d)|dimensity\s*8\d\d\d|tensor\s*g1|tensor\b|exynos\s*1[45]\d\d|\ba1[34]\b", 3),
+    (r"snapdragon\s*(6\s*gen\s*\d|6\d\d)|dimensity\s*[67]\d\d\d|helio\s*g9\d|exynos\s*1[23]\d\d|\ba1[0-2]\b", 2),
+    (r"snapdragon|dimensity|helio|exynos|kirin|unisoc", 1),
+]
+
+PRICE_BANDS = [(300, "budget"), (600, "mid"), (1000, "upper-mid"), (float("inf"), "flagship")]
+
+# Query words -> the price bands they ask for.
+BAND_WORDS = [
+    (r"budget|cheap|affordable|inexpensive|low[- ]cost", ["budget"]),
+    (r"mid[- ]?range|mid[- ]tier", ["mid"]),
+    (r"flagship|premium|high[- ]end", ["upper-mid", "flagship"]),
+]
+_BAND_WORDS = re.compile(r"\b(?:" + "|".join(pattern for pattern, _ in BAND_WORDS) + r")\b", re.IGNORECASE)
+
+# Query words that say nothing about which products fit; every other word is intent the products must match.
+QUERY_STOPWORDS = {
+    "best", "top", "good", "great", "new", "newest", "latest", "recommend", "recommended", "recommendation",
+    "phone", "phones", "smartphone", "smartphones", "mobile", "mobiles", "cell", "cellphone", "device", "devices",
+    "model", "models", "buy", "buying", "get", "should", "which", "what", "one", "the", "and", "for", "with",
+    "that", "this", "has", "have", "are", "is", "or", "vs", "versus", "compare", "comparison", "between", "than",
+    "under", "below", "less", "within", "max", "maximum", "price", "priced", "dollars", "bucks", "usd",
+    "users", "user", "people", "person", "someone", "you", "your", "right", "now", "year", "today", "worth",
+    "can", "could", "would", "will", "how", "who", "why", "where", "when", "there", "any", "all", "most", "really",
+}
+
+# A named model: a product-line or brand keyword followed by a model number and variant words,
+# e.g. 'galaxy s25 ultra', 'pixel 9', 'redmi note 13'.
+_BRAND_KEYWORDS = "|".join(re.escape(keyword) for keyword, _ in BRANDS)
+_MODEL = re.compile(
+    r"\b(" + _BRAND_KEYWORDS + r")\s+((?:(?!(?:" + _BRAND_KEYWORDS + r")\b)[a-z]+\s+){0,2}?[a-z]{0,2}\d+[a-z]*"
+    r"(?:\s+(?:pro|max|ultra|plus|mini|lite|fe)\b)*)\b",
+    re.IGNORECASE
+)
+
+
+def _to_float(value: str) -> float:
+    return float(value.replace(",", ""))
+
+
+def _largest(pattern: re.Pattern, text: str) -> Optional[float]:
+    values = [_to_float(match.group(1)) for match in pattern.finditer(text or "")]
+    return max(values) if values else None
+
+
+def parse_battery_mah(text: str) -> Optional[float]:
+    return _largest(_BATTERY, text)
+
+
+def parse_refresh_hz(text: str) -> Optional[float]:
+    return _largest(_REFRESH, text)
+
+
+def parse_camera_mp(text: str) -> Optional[float]:
+    return _largest(_CAMERA, text)
+
+
+def parse_storage_gb(text: str) -> Optional[float]:
+    """Largest storage option in GB (TB converted)."""
+    values = [_to_float(m.group(1)) * (1024 if m.group(2).lower() == "tb" else 1) for m in _STORAGE.finditer(text or "")]
+    # RAM figures (<= 24GB) are not storage options.
+    values = [value for value in values if value >= 32]
+    return max(values) if values else None
+
+
+def _prices(text: str) -> List[Tuple[int, float]]:
+    """(position, amount) of every dollar price in the text, leaving out discounts ('$100 off', 'save $200')."""
+    prices = []
+    for match in _PRICE.finditer(text or ""):
+        value = _to_float(match.group(1))
+        if value < 50:
+            continue
+        if _DISCOUNT_BEFORE.search(text[max(0, match.start() - 30):match.start()]) or _DISCOUNT_AFTER.match(text, match.end()):
+            continue
+        prices.append((match.start(), value))
+    return prices
+
+
+def _sentence_bounds(text: str, position: int) -> Tuple[int, int]:
+    start = max((m.end() for m in _SENTENCE_END.finditer(text, 0, position)), default=0)
+    end = _SENTENCE_END.search(text, position)
+    return start, end.start() if end else len(text)
+
+
+def _anchored_price(text: str, prices: List[Tuple[int, float]], product_name: Optional[str]) -> Optional[float]:
+    """First price whose nearest product mention in its sentence is `product_name` ('the $799 Pixel 9' belongs to the Pixel 9)."""
+    if not product_name:
+        return None
+    names = {product_name.lower()} | set(query_models(product_name))
+    own = re.compile("|".join(r"\b" + re.escape(name) + r"\b" for name in sorted(names, key=len, reverse=True)), re.IGNORECASE)
+    for position, value in prices:
+        start, end = _sentence_bounds(text, position)
+        mentions = [(m.start(), m.end(), True) for m in own.finditer(text, start, end)]
+        mentions += [
+            (m.start(), m.end(), False) for m in _MODEL.finditer(text, start, end)
+            if not own.fullmatch(" ".join(m.group(0).split()))
+        ]
+        if not mentions:
+            continue
+        nearest = min(mentions, key=lambda mention: max(mention[0] - position, position - mention[1], 0))
+        if nearest[2]:
+            return value
+    return None
+
+
+def parse_price_usd(text: str, product_name: Optional[str] = None) -> Optional[float]:
+    """Best guess at the product's dollar price: the first one stated next to `product_name`, else the first one stated.
+
+    Discount amounts are never taken for a price.
+    """
+    prices = _prices(text)
+    if not prices:
+        return None
+    anchored = _anchored_price(text, prices, product_name)
+    return anchored if anchored is not None else prices[0][1]
+
+
+def stated_price_usd(text: str, product_name: Optional[str] = None) -> Optional[float]:
+    """The product's dollar price only when the text is unambiguous about it, else None (never a guess).
+
+    Unambiguous means stated next to `product_name`, or the only amount the text mentions.
+    """
+    prices = _prices(text)
+    anchored = _anchored_price(text, prices, product_name)
+    if anchored is not None:
+        return anchored
+    values = {value for _, value in prices}
+    return values.pop() if len(values) == 1 else None
+
+
+def parse_processor(text: str) -> Optional[str]:
+    match = _PROCESSOR.search(text or "")
+    return " ".join(match.group(1).split()) if match else None
+
+
+def chipset_tier(processor: Optional[str]) -> Optional[float]:
+    """Performance tier (1-5) of a chipset name, or None when unknown."""
+    if not processor:
+        return None
+    for pattern, tier in CHIPSET_TIERS:
+        if re.search(pattern, processor, re.IGNORECASE):
+            return float(tier)
+    return None
+
+
+def review_text(review: Dict) -> str:
+    """Searchable text of an extracted review: title, content and highlights, one sentence each at least."""
+    highlights = review.get("highlights") or {}
+    if isinstance(highlights, dict):
+        highlights = " ".join(f"{k} {v}" for k, v in highlights.items())
+    return ". ".join(str(part) for part in (review.get("title"), review.get("content"), highlights) if part)
+
+
+def detect_brands(text: str) -> List[str]:
+    """Every brand mentioned in the text, in order of first mention."""
+    lowered = (text or "").lower()
+    found = []
+    for keyword, brand in BRANDS:
+        match = re.search(r"\b" + re.escape(keyword) + r"\b", lowered)
+        if match:
+            found.append((match.start(), brand))
+    brands = []
+    for _, brand in sorted(found):
+        if brand not in brands:
+            brands.append(brand)
+    return brands
+
+
+def detect_brand(text: str, title: Optional[str] = None) -> Optional[str]:
+    """Brand of a single product: the first one its `title` names, else the first one mentioned in `text`.
+
+    Reviews often name competitors ('beats the iPhone 16'), so list order in BRANDS decides nothing here.
+    """
+    brands = detect_brands(title) or detect_brands(text)
+    return brands[0] if brands else None
+
+
+def price_band(price: Optional[float]) -> Optional[str]:
+    if price is None:
+        return None
+    for ceiling, band in PRICE_BANDS:
+        if price <= ceiling:
+            return band
+    return None
+
+
+def _budget_match(query: str) -> Optional[re.Match]:
+    for match in _MAX_PRICE.finditer(query or ""):
+        dollar, amount, thousands, currency = match.groups()
+        if (dollar or thousands or currency) and not _UNIT_AFTER.match(query, match.end()):
+            return match
+    return None
+
+
+def query_filters(query: str) -> Dict:
+    """Brands and maximum price implied by a user query, e.g. 'best samsung phones under $800'.
+
+    A comparison query ('google pixel vs iphone') names several brands; all of them are kept.
+    """
+    match = _budget_match(query)
+    max_price = _to_float(match.group(2)) * (1000 if match.group(3) else 1) if match else None
+    return {"brands": detect_brands(query), "max_price": max_price}
+
+
+def query_models(query: str) -> List[str]:
+    """Models a query names, lower-cased ('pixel 9 vs iphone 16' -> ['pixel 9', 'iphone 16'])."""
+    models = []
+    for match in _MODEL.finditer(query or ""):
+        words = match.group(2).lower().split()
+        if any(word in QUERY_STOPWORDS for word in words):
+            continue
+        model = " ".join([match.group(1).lower()] + words)
+        if model not in models:
+            models.append(model)
+    return models
+
+
+def query_intent(query: str) -> Dict:
+    """Everything a stored product must satisfy to answer `query` without a web search.
+
+    On top of `query_filters`: the models it names, the price bands its wording asks for ('budget',
+    'flagship') and the remaining keywords ('foldable', 'camera', 'elderly') the product text has to mention.
+    """
+    query = query or ""
+    intent = query_filters(query)
+    intent["models"] = query_models(query)
+    intent["price_bands"] = [band for pattern, bands in BAND_WORDS if re.search(pattern, query, re.IGNORECASE) for band in bands]
+    rest = query.lower()
+    budget = _budget_match(rest)
+    if budget:
+        rest = rest[:budget.start()] + " " + rest[budget.end():]
+    rest = _BAND_WORDS.sub(" ", _MODEL.sub(" ", rest))
+    brand_words = {word for keyword, _ in BRANDS for word in keyword.split()}
+    keywords = []
+    for word in re.findall(r"[a-z][a-z-]{2,}", rest):
+        if word not in QUERY_STOPWORDS and word not in brand_words and word not in keywords:
+            keywords.append(word)
+    intent["keywords"] = keywords
+    return intent
+
+
+def mentions(text: str, keyword: str) -> bool:
+    """Whether `text` mentions `keyword`, singular or plural ('buttons' matches 'button')."""
+    stem = keyword[:-1] if len(keyword) > 3 and keyword.endswith("s") else keyword
+    return re.search(r"\b" + re.escape(stem), text or "", re.IGNORECASE) is not None
@@ -0,0 +1,212 @@
+# store.py
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from cache import CACHE_DIR
+from llm_cache import normalize_title
+from specs import (
+    detect_brand, parse_battery_mah, parse_refresh_hz, parse_camera_mp, parse_storage_gb,
+    stated_price_usd, price_band, query_intent, mentions, review_text
+)
+
+PRODUCT_DB_PATH = os.getenv("PRODUCT_DB_PATH", os.path.join(CACHE_DIR, "products.sqlite3"))
+PRODUCT_FRESHNESS = int(os.getenv("PRODUCT_FRESHNESS", str(7 * 24 * 3600)))
+STORE_MIN_PRODUCTS = int(os.getenv("STORE_MIN_PRODUCTS", "4"))
+STORE_MAX_PRODUCTS = int(os.getenv("STORE_MAX_PRODUCTS", "8"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    normalized_name TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    brand TEXT,
+    price_usd REAL,
+    price_band TEXT,
+    processor TEXT,
+    battery_mah REAL,
+    refresh_hz REAL,
+    camera_mp REAL,
+    storage_gb REAL,
+    score REAL,
+    review TEXT,
+    specs TEXT,
+    ratings TEXT,
+    source_urls TEXT NOT NULL DEFAULT '[]',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_brand ON products (brand, updated_at);
+CREATE INDEX IF NOT EXISTS products_price ON products (price_band, price_usd);
+CREATE INDEX IF NOT EXISTS products_specs ON products (battery_mah, refresh_hz, camera_mp, storage_gb);
+CREATE INDEX IF NOT EXISTS products_updated ON products (updated_at);
+"""
+
+
+def _score(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ProductStore:
+    """Local SQLite knowledge base of every product the graph has extracted or compared."""
+
+    def __init__(self, path: str = PRODUCT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _existing(self, conn: sqlite3.Connection, key: str) -> Optional[sqlite3.Row]:
+        return conn.execute("SELECT * FROM products WHERE normalized_name = ?", (key,)).fetchone()
+
+    def upsert_reviews(self, reviews: List[Dict]) -> None:
+        """Insert or refresh extracted `SmartphoneReview` records.
+
+        Prices come only from the review itself, and only when it states one unambiguously
+        (`specs.stated_price_usd`); the budget of the query that found a product says nothing about its
+        price, so it is never stored.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for review in reviews:
+                key = normalize_title(review.get("title") or "")
+                if not key:
+                    continue
+                text = review_text(review)
+                row = self._existing(conn, key)
+                urls = set(json.loads(row["source_urls"])) if row else set()
+                if review.get("url"):
+                    urls.add(review["url"])
+                price = stated_price_usd(text, review["title"]) or (row["price_usd"] if row else None)
+                conn.execute(
+                    """INSERT INTO products (normalized_name, name, brand, price_usd, price_band,
+                           battery_mah, refresh_hz, camera_mp, storage_gb, score, review, source_urls, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(normalized_name) DO UPDATE SET
+                           name = excluded.name, brand = COALESCE(excluded.brand, brand),
+                           price_usd = excluded.price_usd, price_band = excluded.price_band,
+                           battery_mah = COALESCE(excluded.battery_mah, battery_mah),
+                           refresh_hz = COALESCE(excluded.refresh_hz, refresh_hz),
+                           camera_mp = COALESCE(excluded.camera_mp, camera_mp),
+                           storage_gb = COALESCE(excluded.storage_gb, storage_gb),
+                           score = COALESCE(excluded.score, score), review = excluded.review,
+                           source_urls = excluded.source_urls, updated_at = excluded.updated_at""",
+                    (key, review["title"], detect_brand(text, review["title"]), price, price_band(price),
+                     parse_battery_mah(text), parse_refresh_hz(text), parse_camera_mp(text), parse_storage_gb(text),
+                     _score(review.get("score")), json.dumps(review), json.dumps(sorted(urls)), now, now)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def upsert_comparisons(self, comparisons: List[Dict]) -> None:
+        """Attach LLM-compared specs and ratings to stored products."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for comparison in comparisons:
+                key = normalize_title(comparison.get("product_name") or "")
+                specs = comparison.get("specs_comparison") or {}
+                if not key or self._existing(conn, key) is None:
+                    continue
+                conn.execute(
+                    """UPDATE products SET processor = ?, specs = ?, ratings = ?,
+                           battery_mah = COALESCE(?, battery_mah), refresh_hz = COALESCE(?, refresh_hz),
+                           camera_mp = COALESCE(?, camera_mp), storage_gb = COALESCE(?, storage_gb), updated_at = ?
+                       WHERE normalized_name = ?""",
+                    (specs.get("processor"), json.dumps(specs), json.dumps(comparison.get("ratings_comparison") or {}),
+                     parse_battery_mah(specs.get("battery", "")), parse_refresh_hz(specs.get("display", "")),
+                     parse_camera_mp(specs.get("camera", "")), parse_storage_gb(specs.get("storage", "")), now, key)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def find(self, brands: Optional[List[str]] = None, max_price: Optional[float] = None,
+             price_bands: Optional[List[str]] = None, models: Optional[List[str]] = None,
+             keywords: Optional[List[str]] = None, max_age: float = PRODUCT_FRESHNESS,
+             limit: int = STORE_MAX_PRODUCTS) -> List[Dict]:
+        """Fresh stored reviews matching the filters, best scored first.
+
+        A review matches when it is of one of `brands`, within `max_price` and `price_bands`, is one of
+        `models` (when any are given) and its text mentions every keyword.
+        """
+        clauses, params = ["updated_at >= ?"], [time.time() - max_age]
+        if brands:
+            clauses.append(f"brand IN ({', '.join('?' * len(brands))})")
+            params.extend(brands)
+        if max_price:
+            clauses.append("price_usd <= ?")
+            params.append(max_price)
+        if price_bands:
+            clauses.append(f"price_band IN ({', '.join('?' * len(price_bands))})")
+            params.extend(price_bands)
+        rows = self._connect().execute(
+            f"SELECT normalized_name, review FROM products WHERE {' AND '.join(clauses)} ORDER BY score DESC, updated_at DESC",
+            params
+        )
+        reviews = []
+        for row in rows:
+            if models and not any(names_model(row["normalized_name"], model) for model in models):
+                continue
+            review = json.loads(row["review"])
+            text = review_text(review)
+            if all(mentions(text, keyword) for keyword in keywords or ()):
+                reviews.append(review)
+                if len(reviews) >= limit:
+                    break
+        return reviews
+
+    def find_for_query(self, query: str, **kwargs) -> List[Dict]:
+        """Stored reviews matching the intent of `query` (see `specs.query_intent`)."""
+        return self.find(**query_intent(query), **kwargs)
+
+
+def names_model(title: str, model: str) -> bool:
+    """Whether a product title is the named model or a variant of it ('pixel 9' matches 'Pixel 9 Pro', not 'Pixel 9a')."""
+    return re.search(r"\b" + re.escape(model) + r"\b", normalize_title(title)) is not None
+
+
+def covers_query(query: str, products: List[Dict]) -> bool:
+    """Whether products found for `query` answer it on their own.
+
+    Every model the query names must be among them; otherwise at least STORE_MIN_PRODUCTS must match.
+    Anything less is a gap to fill from the web.
+    """
+    models = query_intent(query)["models"]
+    if models:
+        return all(any(names_model(product.get("title", ""), model) for product in products) for model in models)
+    return len(products) >= STORE_MIN_PRODUCTS
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ProductStore:
+    """Return the process-wide product store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProductStore()
+    return _store
@@ -0,0 +1,217 @@
+# telemetry.py
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "100000"))
+
+# Latencies kept per histogram for percentiles: exact up to this many observations, a uniform sample after.
+HISTOGRAM_SAMPLE_SIZE = int(os.getenv("HISTOGRAM_SAMPLE_SIZE", "4096"))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_current_run = contextvars.ContextVar("current_run", default=None)
+
+
+class Histogram:
+    """Latency histogram with count, sum, min, max and percentiles from a bounded reservoir sample."""
+
+    def __init__(self, sample_size: int = HISTOGRAM_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.sample = []
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self._random = random.Random(0)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append(value)
+        else:
+            # Reservoir sampling: every observation so far is kept with equal probability.
+            slot = self._random.randrange(self.count)
+            if slot < self.sample_size:
+                self.sample[slot] = value
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """q-th percentile, linearly interpolated between the closest observations (exact while count <= sample_size)."""
+        if not self.sample:
+            return 0.0
+        ordered = sorted(self.sample)
+        rank = q / 100 * (len(ordered) - 1)
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class Telemetry:
+    """In-process spans, histograms and counters with Chrome trace-event export."""
+
+    def __init__(self, buffer_size: int = TRACE_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=buffer_size)
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self._epoch = time.perf_counter()
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self.histograms.setdefault(name, Histogram()).observe(value)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def span(self, name: str, kind: str = "external", **attributes):
+        """Time a block; the yielded dict collects attributes (retries, tokens, bytes, cache_hit...)."""
+        parent = _current_span.get()
+        attrs = dict(attributes)
+        attrs["span_id"] = uuid.uuid4().hex[:16]
+        if parent is not None:
+            attrs["parent_id"] = parent["span_id"]
+        if _current_run.get():
+            attrs["run_id"] = _current_run.get()
+        token = _current_span.set(attrs)
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._record(name, kind, start, duration_ms, attrs)
+
+    def _record(self, name: str, kind: str, start: float, duration_ms: float, attrs: Dict[str, Any]) -> None:
+        self.observe(f"{kind}.{name}.ms", duration_ms)
+        if attrs.get("wait_ms"):
+            self.observe(f"{kind}.{name}.wait_ms", attrs["wait_ms"])
+        for key in ("retries", "prompt_tokens", "completion_tokens", "bytes"):
+            if attrs.get(key):
+                self.count(f"{kind}.{name}.{key}", attrs[key])
+        if "cache_hit" in attrs:
+            self.count(f"{kind}.{name}.cache_{'hits' if attrs['cache_hit'] else 'misses'}")
+        with self._lock:
+            self._events.append({
+                "name": name,
+                "cat": kind,
+                "ph": "X",
+                "ts": (start - self._epoch) * 1e6,
+                "dur": duration_ms * 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": attrs,
+            })
+
+    def annotate(self, **attributes) -> None:
+        """Add to numeric attributes (or set others) on the innermost active span."""
+        current = _current_span.get()
+        if current is None:
+            return
+        for key, value in attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and key in current:
+                current[key] += value
+            else:
+                current[key] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def export_trace(self, path: str) -> None:
+        """Write buffered spans as a Chrome trace-event JSON file (viewable in Perfetto or chrome://tracing)."""
+        with self._lock:
+            events = list(self._events)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "metadata": self.snapshot()}, f, default=str)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._events.clear()
+            self.histograms.clear()
+            self.counters.clear()
+
+
+telemetry = Telemetry()
+span = telemetry.span
+annotate = telemetry.annotate
+
+
+@contextmanager
+def run_context(run_id: Optional[str] = None):
+    """Tag every span recorded inside the block with a run id."""
+    token = _current_run.set(run_id or uuid.uuid4().hex)
+    try:
+        yield _current_run.get()
+    finally:
+        _current_run.reset(token)
+
+
+def traced_node(name: str, node):
+    """Wrap a graph node (sync or async) so each execution is recorded as a `node` span."""
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state):
+            with span(name, kind="node"):
+                return await node(state)
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state):
+        with span(name, kind="node"):
+            return node(state)
+    return wrapper
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Adds prompt/completion token counts from chat model responses to the active span."""
+
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens = (prompt_tokens or 0) + metadata.get("input_tokens", 0)
+                    completion_tokens = (completion_tokens or 0) + metadata.get("output_tokens", 0)
+        annotate(prompt_tokens=prompt_tokens or 0, completion_tokens=completion_tokens or 0)
+
+
+if TRACE_FILE:
+    atexit.register(lambda: telemetry.export_trace(TRACE_FILE))
@@ -1,42 +1,143 @@
 # utils.py
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from langchain_community.document_loaders import WebBaseLoader
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from config import get_client
+from scheduler import scheduler
+from telemetry import span
+from cache import get_cache, content_key, normalize_url, normalize_query, PAGE_CACHE_TTL, SEARCH_CACHE_TTL
+import contextvars
+import json
 import os 
-from dotenv import load_dotenv
-load_dotenv()
-os.environ["GMAIL_USER"] = os.getenv("GMAIL_USER")
-os.environ["GMAIL_PASS"] = os.getenv("GMAIL_PASS")
-def send_email(recipient_email: str, subject: str, body: str) -> None:
-    """Send an email dynamically using SMTP."""
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
-    sender_email = os.environ("GMAIL_USER")
-    sender_password = os.environ("GMAIL_PASS")
-
-    try:
-        message = MIMEMultipart()
-        message['From'] = sender_email
-        message['To'] = recipient_email
-        message['Subject'] = subject
-        message.attach(MIMEText(body, 'html'))
-
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(message)
-            print(f"Email sent successfully to {recipient_email}.")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-
-def load_blog_content(page_url: str) -> str:
-    """Load content from a specific URL."""
-    try:
-        loader = WebBaseLoader(web_paths=[page_url], bs_get_text_kwargs={"separator": " ", "strip": True})
-        loaded_content = loader.load()
-        blog_content = " ".join([doc.page_content for doc in loaded_content])
-        return blog_content
-    except Exception as e:
-        print(f"Error loading blog content from URL {page_url}: {e}")
-        return ""
\ No newline at end of file
+import queue
+import threading
+import time
+
+USER_AGENT = os.getenv("USER_AGENT", "Mozilla/5.0 (compatible; SmartphoneConsultant/1.0)")
+
+def send_email(recipient_email: str, subject: str, body: str, idempotency_key: Optional[str] = None) -> int:
+    """Queue an HTML email for background delivery and return its outbox id.
+
+    Sending again with the same `idempotency_key` returns the existing message instead of queueing a copy,
+    even when the subject or body changed.
+    """
+    message_id, queued = get_client("mailer").enqueue(recipient_email, subject, body, idempotency_key=idempotency_key)
+    if queued:
+        print(f"Email to {recipient_email} queued for delivery.")
+    else:
+        print(f"Email to {recipient_email} not queued: '{idempotency_key}' was already queued as message {message_id}.")
+    return message_id
+
+class HostBusy(Exception):
+    """Raised by `fetch_page` when a page is not cached and its host has no free connection slot."""
+
+def fetch_page(page_url: str, session=None, timeout: float = 10.0, host_slot=None) -> bytes:
+    """Fetch raw page bytes through the disk cache, revalidating stale entries with ETag/Last-Modified.
+
+    With `host_slot` (`config.HostSlots`), cache hits never wait for it; a network fetch takes a slot only
+    if one is free right away and raises `HostBusy` otherwise.
+    """
+    with span("page_fetch", url=page_url) as attrs:
+        cache = get_cache()
+        key = content_key(normalize_url(page_url))
+        cached = cache.get("page", key)
+        attrs["cache_hit"] = cached is not None and cached.fresh
+        if attrs["cache_hit"]:
+            return cached.value
+        if host_slot is not None and not host_slot.acquire():
+            attrs["host_busy"] = True
+            raise HostBusy(page_url)
+
+        try:
+            headers = {"User-Agent": USER_AGENT}
+            if cached is not None:
+                if cached.etag:
+                    headers["If-None-Match"] = cached.etag
+                if cached.last_modified:
+                    headers["If-Modified-Since"] = cached.last_modified
+
+            session = session or get_client("http_session")
+            response = session.get(page_url, timeout=timeout, headers=headers)
+        finally:
+            if host_slot is not None:
+                host_slot.release()
+        attrs["status"] = response.status_code
+        if response.status_code == 304 and cached is not None:
+            attrs["revalidated"] = True
+            cache.touch("page", key, PAGE_CACHE_TTL)
+            return cached.value
+        response.raise_for_status()
+        attrs["bytes"] = len(response.content)
+        cache.set("page", key, response.content, PAGE_CACHE_TTL,
+                  etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+        return response.content
+
+def search_web(tavily_client, query: str, max_results: int) -> Dict:
+    """Run a Tavily search, serving repeated queries from the disk cache."""
+    with span("web_search", query=query) as attrs:
+        cache = get_cache()
+        key = content_key(normalize_query(query), max_results)
+        cached = cache.get("search", key)
+        attrs["cache_hit"] = cached is not None and cached.fresh
+        if attrs["cache_hit"]:
+            return json.loads(cached.value)
+        response = scheduler.call("tavily", tavily_client.search, query=query, max_results=max_results)
+        if response.get("results"):
+            cache.set("search", key, json.dumps(response).encode("utf-8"), SEARCH_CACHE_TTL)
+        return response
+
+def load_blog_pages(page_urls: List[str], page_timeout: float = 10.0, deadline: float = 20.0) -> Dict[str, bytes]:
+    """Fetch raw pages concurrently; pages not done before `deadline` seconds are dropped.
+
+    The fetch pool and per-host limits are process-wide, so concurrent runs together never open more than
+    FETCH_PER_HOST_LIMIT connections to one site. A page whose host is busy is resubmitted when the host
+    frees a slot instead of parking a pool thread, so one slow host cannot starve other runs' fetches.
+    """
+    session = get_client("http_session")
+    host_limiter = get_client("host_limiter")
+    executor = get_client("fetch_executor")
+    context = contextvars.copy_context()
+    results = queue.Queue()
+    expired = threading.Event()
+    futures = []
+
+    def fetch(url):
+        if expired.is_set():
+            return
+        slots = host_limiter.for_host(urlparse(url).netloc)
+        try:
+            html = fetch_page(url, session=session, timeout=page_timeout, host_slot=slots)
+        except HostBusy:
+            slots.when_free(lambda: submit(url))
+            return
+        except Exception as e:
+            print(f"Error loading blog content from URL {url}: {e}")
+            html = b""
+        results.put((url, html))
+
+    def submit(url) -> bool:
+        # May run on another run's thread (when it frees a slot), so the task gets a copy of this run's context.
+        if expired.is_set():
+            return False
+        futures.append(executor.submit(context.copy().run, fetch, url))
+        return True
+
+    stop_at = time.monotonic() + deadline
+    pending = set(page_urls)
+    for url in pending:
+        submit(url)
+    pages = {}
+    while pending:
+        try:
+            url, html = results.get(timeout=max(0.0, stop_at - time.monotonic()))
+        except queue.Empty:
+            break
+        pending.discard(url)
+        if html:
+            pages[url] = html
+
+    expired.set()
+    for future in futures:
+        future.cancel()
+    for url in pending:
+        print(f"Dropped slow page {url} (deadline {deadline}s exceeded).")
+    return pages
@@ -0,0 +1,12 @@
+import os
+
+from benchmark import LAZY_MODULES, measure_import
+
+# Matches the documented `python benchmark.py --import-budget 1500` check; raise it on slow CI machines.
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+
+def test_import_main_stays_lazy_and_within_budget():
+    elapsed, loaded = measure_import("main")
+    assert not loaded, f"import main loaded provider SDKs eagerly: {loaded} (expected none of {LAZY_MODULES})"
+    assert elapsed <= IMPORT_BUDGET_MS, f"import main took {elapsed:.0f}ms, budget {IMPORT_BUDGET_MS:.0f}ms"
@@ -0,0 +1,25 @@
+from extraction import ProductMerger
+from models import ProductRecord
+
+
+def test_merge_keeps_products_after_string_highlights():
+    merger = ProductMerger()
+    merger.add([{"title": "Pixel 9", "highlights": "Great camera"}])
+    merger.add([{"title": "Pixel 9", "highlights": {"Display": "120Hz OLED"}}, {"title": "iPhone 16"}])
+
+    products = {product["title"]: product for product in merger.products()}
+    assert sorted(products) == ["Pixel 9", "iPhone 16"]
+    assert products["Pixel 9"]["highlights"] == {"Summary": "Great camera", "Display": "120Hz OLED"}
+
+
+def test_merge_treats_string_pros_and_cons_as_single_items():
+    merger = ProductMerger()
+    merger.add([{"title": "Pixel 9", "pros": "Great camera", "cons": None}])
+    merger.add([{"title": "Pixel 9", "pros": "Long battery", "cons": "Slow charging"}])
+
+    product = merger.products()[0]
+    assert product["pros"] == ["Great camera", "Long battery"]
+    assert product["cons"] == ["Slow charging"]
+    record = ProductRecord.from_dict(product)
+    assert record.pros == ("Great camera", "Long battery")
+    assert record.cons == ("Slow charging",)
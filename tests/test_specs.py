@@ -0,0 +1,7 @@
+from specs import detect_brand
+
+
+def test_detect_brand_prefers_title_then_first_mention():
+    assert detect_brand("Google Pixel 9. Beats the iPhone 16 on battery") == "Google"
+    assert detect_brand("Beats the iPhone 16 on battery.", title="Google Pixel 9") == "Google"
+    assert detect_brand("No brand named here.") is None